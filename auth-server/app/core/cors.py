@@ -0,0 +1,22 @@
+from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp
+
+
+class ClientOriginsCORSMiddleware(CORSMiddleware):
+    """登録済みクライアントのURIをオリジンとして許可するCORS
+
+    許可するオリジンはクライアント設定の再読み込み (SIGHUP) のたびに
+    クライアントレジストリから組み立て直す。
+    """
+
+    def __init__(self, app: ASGIApp, registry, **kwargs):
+        super().__init__(app, **kwargs)
+        self.registry = registry
+        self.refresh_origins()
+        registry.on_reload(self.refresh_origins)
+
+    def refresh_origins(self) -> None:
+        # 判定中のリクエストから見て一貫するよう、集合を丸ごと差し替える
+        self.allow_origins = frozenset(
+            client.uri for client in self.registry if client.uri
+        )
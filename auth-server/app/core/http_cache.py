@@ -0,0 +1,22 @@
+from fastapi import Request, Response
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match ヘッダーが指定のETagに一致するか (弱い比較)"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return etag in candidates
+
+
+def cached_json_response(
+    request: Request, body: bytes, etag: str, cache_control: str
+) -> Response:
+    """事前にシリアライズ済みのJSONを ETag / Cache-Control 付きで返す"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
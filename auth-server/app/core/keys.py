@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from authlib.jose import JsonWebKey
+from app.core.config import settings
+
+# アルゴリズムごとの鍵生成パラメータ
+KEY_TYPES = {
+    "RS256": ("RSA", 2048),
+    "ES256": ("EC", "P-256"),
+}
+
+
+class SigningKey:
+    def __init__(self, kid: str, key, created_at: datetime):
+        self.kid = kid
+        self.key = key  # 読み込み済みの鍵オブジェクト (署名ごとにPEMを解析しない)
+        self.created_at = created_at
+        self.retired_at: Optional[datetime] = None
+
+
+class KeySet:
+    """非対称署名鍵の管理
+
+    鍵は kid で識別する。次に使う鍵を事前に JWKS へ公開しておき、
+    ローテーション後も旧鍵を overlap の間は検証用に残す。
+
+    ローテーションで生成する鍵はプロセス内にしか存在しないため、
+    ローテーションは単一プロセスで動かす場合のみ有効。
+    rotation_interval が None の場合はローテーションせず、初期鍵のみを使う。
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        rotation_interval: Optional[timedelta],
+        overlap: timedelta,
+        initial_key=None,
+    ):
+        if algorithm not in KEY_TYPES:
+            raise ValueError(f"Unsupported signing algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.rotation_interval = rotation_interval
+        self.overlap = overlap
+        now = datetime.now()
+        self._active = self._new_key(now, initial_key)
+        self._next = self._new_key(now) if rotation_interval else None
+        self._retired: List[SigningKey] = []
+        self._refresh(now)
+
+    @classmethod
+    def from_settings(
+        cls, algorithm: str, key_path: Optional[str]
+    ) -> Optional["KeySet"]:
+        if algorithm not in KEY_TYPES:
+            return None
+        initial_key = None
+        rotation_interval = timedelta(hours=settings.SIGNING_KEY_ROTATION_HOURS)
+        if key_path:
+            # 鍵ファイルを共有する複数ワーカーで鍵が食い違わないよう、ローテーションしない
+            with open(key_path, "rb") as f:
+                initial_key = f.read()
+            rotation_interval = None
+        return cls(
+            algorithm,
+            rotation_interval=rotation_interval,
+            overlap=timedelta(hours=settings.SIGNING_KEY_OVERLAP_HOURS),
+            initial_key=initial_key,
+        )
+
+    @property
+    def current(self) -> SigningKey:
+        return self._active
+
+    def get(self, kid: str) -> SigningKey:
+        signing_key = self._by_kid.get(kid)
+        if not signing_key:
+            raise ValueError("Unknown key id")
+        return signing_key
+
+    @property
+    def rotates(self) -> bool:
+        return self.rotation_interval is not None
+
+    def rotate(self, now: Optional[datetime] = None) -> None:
+        if not self.rotates:
+            raise ValueError("Key rotation is disabled")
+        now = now or datetime.now()
+        self._active.retired_at = now
+        self._retired.append(self._active)
+        self._active = self._next
+        self._active.created_at = now
+        self._next = self._new_key(now)
+        self._refresh(now)
+
+    def rotate_if_due(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        if self.rotates and now - self._active.created_at >= self.rotation_interval:
+            self.rotate(now)
+            return True
+        # ローテーションがなくても期限切れの旧鍵は削除する
+        if any(now - k.retired_at >= self.overlap for k in self._retired):
+            self._refresh(now)
+        return False
+
+    def jwks_bytes(self) -> bytes:
+        return self._jwks
+
+    def jwks_etag(self) -> str:
+        return self._etag
+
+    def _new_key(self, now: datetime, raw=None) -> SigningKey:
+        if raw is not None:
+            key = JsonWebKey.import_key(raw)
+        else:
+            kty, crv_or_size = KEY_TYPES[self.algorithm]
+            key = JsonWebKey.generate_key(kty, crv_or_size, is_private=True)
+        # kid は RFC 7638 の thumbprint とし、同じ鍵ならプロセス間で一致させる
+        return SigningKey(key.thumbprint(), key, now)
+
+    def _public_jwk(self, signing_key: SigningKey) -> dict:
+        return {
+            **signing_key.key.as_dict(is_private=False),
+            "kid": signing_key.kid,
+            "alg": self.algorithm,
+            "use": "sig",
+        }
+
+    def _refresh(self, now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        self._retired = [k for k in self._retired if now - k.retired_at < self.overlap]
+        keys = [self._active, *self._retired]
+        if self._next:
+            keys.insert(1, self._next)
+        self._by_kid = {k.kid: k for k in keys}
+        # JWKS は鍵の変更時にのみシリアライズする
+        jwks = {"keys": [self._public_jwk(k) for k in keys]}
+        self._jwks = json.dumps(jwks, separators=(",", ":")).encode()
+        self._etag = '"' + hashlib.sha256(self._jwks).hexdigest()[:32] + '"'
+
+
+async def run_rotation(key_set: KeySet, interval: float) -> None:
+    """バックグラウンドで鍵のローテーション時期を確認する"""
+    while True:
+        await asyncio.sleep(interval)
+        key_set.rotate_if_due()
+
+
+def published_jwks() -> Tuple[bytes, str]:
+    """公開する全ての鍵 (アクセストークン用とIDトークン用) の JWKS と ETag"""
+    global _published
+    etags = tuple(k.jwks_etag() for k in published_key_sets)
+    if _published[0] != etags:
+        keys = [
+            jwk for k in published_key_sets for jwk in json.loads(k.jwks_bytes())["keys"]
+        ]
+        body = json.dumps({"keys": keys}, separators=(",", ":")).encode()
+        _published = (etags, body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+    return _published[1], _published[2]
+
+
+# アクセストークンの署名鍵 (HS256 の場合は None)
+key_set = KeySet.from_settings(settings.ALGORITHM, settings.SIGNING_KEY_PATH)
+# IDトークンは OIDC の既定である RS256 で署名する (アクセストークンが RS256 なら同じ鍵)
+id_token_key_set = (
+    key_set
+    if settings.ALGORITHM == "RS256"
+    else KeySet.from_settings("RS256", settings.ID_TOKEN_SIGNING_KEY_PATH)
+)
+published_key_sets = [id_token_key_set]
+if key_set and key_set is not id_token_key_set:
+    published_key_sets.append(key_set)
+_published: Tuple[Tuple[str, ...], bytes, str] = ((), b"", "")
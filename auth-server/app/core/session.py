@@ -0,0 +1,223 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.services.token_store import TokenStore, create_token_store, run_store_io
+
+
+class SessionData(dict):
+    """変更の有無を記録するセッション辞書
+
+    トップレベルのキーへの代入・削除のみを変更として扱う。
+    ネストした値を書き換える場合は、キーに代入し直すこと。
+    """
+
+    modified = False
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self.modified = True
+        return super().pop(key, *args)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        if self:
+            self.modified = True
+        super().clear()
+
+
+class MemorySessionBackend:
+    """プロセス内のLRU + TTLのセッション保存領域"""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        """セッションの内容と残りの有効期間 (秒) を返す"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            remaining = entry[0] - time.monotonic()
+            if remaining <= 0:
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return entry[1], remaining
+
+    def save(self, session_id: str, data: dict) -> None:
+        with self._lock:
+            self._entries[session_id] = (time.monotonic() + self.ttl, dict(data))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, (exp, _) in self._entries.items() if exp <= now]
+            for session_id in expired:
+                del self._entries[session_id]
+        return len(expired)
+
+
+class StoreSessionBackend:
+    """トークン保存領域 (TOKEN_STORE_BACKEND) を使うセッション保存領域
+
+    sqlite バックエンドと組み合わせると複数ワーカーで共有できる。
+    """
+
+    def __init__(self, store: TokenStore, ttl: int):
+        self.store = store
+        self.ttl = ttl
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def load(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        """セッションの内容と残りの有効期間 (秒) を返す"""
+        entry = self.store.get(session_id)
+        if entry is None:
+            return None
+        remaining = (entry["expires_at"] - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return None
+        return entry["data"], remaining
+
+    def save(self, session_id: str, data: dict) -> None:
+        expires_at = datetime.now() + timedelta(seconds=self.ttl)
+        self.store.set(
+            session_id, {"data": dict(data), "expires_at": expires_at}, expires_at
+        )
+
+    def delete(self, session_id: str) -> None:
+        self.store.delete(session_id)
+
+    def sweep(self) -> int:
+        return self.store.sweep()
+
+
+def create_session_backend():
+    if settings.SESSION_BACKEND == "store":
+        return StoreSessionBackend(
+            create_token_store("sessions"), settings.SESSION_TTL_SECONDS
+        )
+    if settings.SESSION_BACKEND == "memory":
+        return MemorySessionBackend(
+            settings.SESSION_MAX_ENTRIES, settings.SESSION_TTL_SECONDS
+        )
+    raise ValueError(f"Unsupported session backend: {settings.SESSION_BACKEND}")
+
+
+class ServerSessionMiddleware:
+    """セッション本体をサーバー側に保存し、Cookieには不透明なIDのみを載せる
+
+    SessionMiddleware と同じく request.session を提供する。
+    セッションが変更されたリクエストでのみ保存とCookieの再発行を行う。
+    読み込みのみのリクエストでも、有効期間が半分を切ったセッションは保存し直して
+    期限を延長する (スライディング有効期限。書き込みは有効期間の半分に1回まで)。
+    ログイン/ログアウトなどで session["user"] が変わった場合はセッションIDを
+    発行し直し、ログイン前に知られたIDを使い回させない (セッション固定攻撃の対策)。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend,
+        session_cookie: str = "session",
+        max_age: int = 3600,
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self.backend = backend
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:
+            self.security_flags += "; secure"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        session_id = connection.cookies.get(self.session_cookie)
+        loaded = await run_store_io(self.backend.load, session_id) if session_id else None
+        if loaded is None:
+            session_id = None
+            data, remaining = {}, 0.0
+        else:
+            data, remaining = loaded
+        session = SessionData(data)
+        scope["session"] = session
+        user = session.get("user")
+        refresh = session_id is not None and remaining < self.max_age / 2
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and (
+                session.modified or refresh
+            ):
+                headers = MutableHeaders(scope=message)
+                if session:
+                    new_id = session_id
+                    if new_id is None or session.get("user") != user:
+                        if new_id:
+                            await run_store_io(self.backend.delete, new_id)
+                        new_id = secrets.token_urlsafe(32)
+                    await run_store_io(self.backend.save, new_id, session)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}={new_id}; path={self.path}; "
+                        f"Max-Age={self.max_age}; {self.security_flags}",
+                    )
+                elif session_id:
+                    # セッションが空になった場合は削除する
+                    await run_store_io(self.backend.delete, session_id)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}=null; path={self.path}; "
+                        f"expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,3 +1,51 @@
+import os
+from functools import lru_cache
+from typing import FrozenSet
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
+from app.core.config import settings
 
-templates = Jinja2Templates(directory="app/templates") 
\ No newline at end of file
+TEMPLATE_DIRECTORY = "app/templates"
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache:
+    # コンパイル結果をファイルに保存し、ワーカー間・再起動後も再利用する
+    os.makedirs(settings.TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    return FileSystemBytecodeCache(settings.TEMPLATE_BYTECODE_CACHE_DIR)
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIRECTORY),
+    autoescape=True,
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+)
+
+
+@lru_cache(maxsize=256)
+def _render_fragment(template_name: str, scopes: FrozenSet[str]) -> Markup:
+    known = [s for s in settings.SCOPE_DESCRIPTIONS if s in scopes]
+    ordered = known + sorted(scopes - set(known))
+    html = env.get_template(template_name).render(
+        scopes=ordered, descriptions=settings.SCOPE_DESCRIPTIONS
+    )
+    return Markup(html)
+
+
+def cached_fragment(template_name: str, scope: str) -> Markup:
+    """リクエストに依存しない部分テンプレートを (テンプレート, スコープ集合) ごとにキャッシュする"""
+    return _render_fragment(template_name, frozenset(scope.split()))
+
+
+def precompile_templates() -> int:
+    """起動時に全テンプレートをコンパイルし、初回リクエストの遅延をなくす"""
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+env.globals["cached_fragment"] = cached_fragment
+
+templates = Jinja2Templates(env=env)
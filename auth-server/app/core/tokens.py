@@ -0,0 +1,150 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+import json
+import os
+import secrets
+from typing import Optional, Tuple
+from authlib.jose import JsonWebToken
+from authlib.jose.errors import ExpiredTokenError, JoseError
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from app.core.config import settings
+from app.core.keys import id_token_key_set, key_set
+
+# 設定されたアルゴリズム以外 (none 等) は受け付けない
+jwt = JsonWebToken([settings.ALGORITHM])
+id_token_jwt = JsonWebToken(["RS256"])
+
+
+def is_jwt(token: str) -> bool:
+    # secrets.token_urlsafe は "." を含まないため、形式で判別できる
+    return token.count(".") == 2
+
+
+def encode_access_token(
+    client_id: str, user_id: Optional[int], scope: str, expires_at: datetime
+) -> str:
+    """自己完結型の署名付きアクセストークン (JWT) を生成する
+
+    user_id が None (client_credentials) の場合は sub をクライアントIDとし、
+    gty クレームでユーザーに紐づかないトークンであることを示す。
+    """
+    payload = {
+        "iss": settings.ISSUER,
+        "sub": str(user_id) if user_id is not None else client_id,
+        "client_id": client_id,
+        "scope": scope,
+        "iat": int(datetime.now().timestamp()),
+        "exp": int(expires_at.timestamp()),
+        "jti": secrets.token_urlsafe(16),
+    }
+    if user_id is None:
+        payload["gty"] = "client_credentials"
+    header = {"alg": settings.ALGORITHM, "typ": "at+jwt"}
+    if key_set:
+        signing_key = key_set.current
+        header["kid"] = signing_key.kid
+        return jwt.encode(header, payload, signing_key.key).decode()
+    return jwt.encode(header, payload, settings.SECRET_KEY).decode()
+
+
+def encode_id_token(
+    client_id: str, claims: dict, expires_at: datetime, nonce: Optional[str] = None
+) -> str:
+    """OpenID Connect の IDトークンを生成する
+
+    アクセストークンの形式によらず RS256 で署名し、JWKS で検証できるようにする。
+    """
+    payload = {
+        **claims,
+        "iss": settings.ISSUER,
+        "aud": client_id,
+        "iat": int(datetime.now().timestamp()),
+        "exp": int(expires_at.timestamp()),
+    }
+    if nonce is not None:
+        payload["nonce"] = nonce
+    signing_key = id_token_key_set.current
+    header = {"alg": "RS256", "typ": "JWT", "kid": signing_key.kid}
+    return id_token_jwt.encode(header, payload, signing_key.key).decode()
+
+
+def id_token_lifetime() -> timedelta:
+    return timedelta(minutes=settings.ID_TOKEN_EXPIRE_MINUTES)
+
+
+def _verification_key(header: dict, payload: dict):
+    if key_set:
+        # kid で検証鍵を選択する (ローテーション直後の旧鍵も含む)
+        return key_set.get(header.get("kid")).key
+    return settings.SECRET_KEY
+
+
+def decode_access_token(token: str) -> dict:
+    """署名・発行者・有効期限を検証し、クレームを返す
+
+    同じ鍵で署名した ID トークンをアクセストークンとして受け付けないように、
+    ヘッダーの typ (at+jwt) とアクセストークン固有のクレームも検証する。
+    """
+    try:
+        claims = jwt.decode(
+            token,
+            _verification_key,
+            claims_options={
+                "iss": {"essential": True, "value": settings.ISSUER},
+                "exp": {"essential": True},
+                "jti": {"essential": True},
+                "client_id": {"essential": True},
+                "scope": {"essential": True},
+            },
+        )
+        if claims.header.get("typ") != "at+jwt":
+            raise ValueError("Invalid token")
+        claims.validate()
+    except ExpiredTokenError:
+        raise ValueError("Token expired")
+    except (JoseError, ValueError):
+        raise ValueError("Invalid token")
+    return dict(claims)
+
+
+def access_token_lifetime() -> timedelta:
+    return timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+def _derive_code_key(secret_key: str) -> AESGCM:
+    # SECRET_KEY をそのまま使わず、認可コード専用の鍵を導出する
+    key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"authorization-code",
+    ).derive(secret_key.encode())
+    return AESGCM(key)
+
+
+_code_cipher = _derive_code_key(settings.SECRET_KEY)
+
+
+def seal_authorization_code(data: dict) -> str:
+    """認可コードの内容を AES-GCM で暗号化し、コード自体に格納する"""
+    nonce = os.urandom(12)
+    plaintext = json.dumps(data, separators=(",", ":")).encode()
+    sealed = nonce + _code_cipher.encrypt(nonce, plaintext, None)
+    return urlsafe_b64encode(sealed).rstrip(b"=").decode()
+
+
+def open_authorization_code(code: str) -> Tuple[str, dict]:
+    """復号して (コードID, 内容) を返す。改ざんや不正な形式は ValueError
+
+    nonce はコードごとに一意なため、使用済みコードの識別子として使う。
+    """
+    try:
+        sealed = urlsafe_b64decode(code + "=" * (-len(code) % 4))
+        nonce, ciphertext = sealed[:12], sealed[12:]
+        data = json.loads(_code_cipher.decrypt(nonce, ciphertext, None))
+    except (InvalidTag, ValueError, TypeError):
+        raise ValueError("Invalid authorization code")
+    return nonce.hex(), data
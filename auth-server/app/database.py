@@ -1,14 +1,96 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.core.metrics import db_query_duration
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./auth.db"
+# 非同期ドライバ -> スクリプト用の同期ドライバ
+SYNC_DRIVERS = {
+    "sqlite+aiosqlite": "sqlite",
+    "postgresql+asyncpg": "postgresql+psycopg2",
+    "postgresql+psycopg": "postgresql+psycopg",
+}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def sync_database_url(url: str) -> URL:
+    """DATABASE_URL (非同期ドライバ) から同じデータベースを指す同期URLを導出する"""
+    url = make_url(url)
+    return url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def _engine_options(url: URL) -> dict:
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # インメモリDBは接続ごとに別のDBになるため、プールの設定は適用しない
+            return {}
+        options = {"connect_args": {"check_same_thread": False}}
+    else:
+        options = {}
+    return {
+        **options,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+    }
+
+
+def _apply_sqlite_pragmas(engine) -> None:
+    """接続ごとに WAL などのPRAGMAを設定する (SQLite以外では何もしない)"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL では読み取りが書き込みを待たず、書き込みもジャーナルの書き直しを伴わない
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.close()
+
+
+def create_database_engines(async_url: str):
+    """ルートハンドラ用の非同期エンジンと、スクリプト用の同期エンジンを生成する"""
+    sync_url = (
+        make_url(settings.DATABASE_SYNC_URL)
+        if settings.DATABASE_SYNC_URL
+        else sync_database_url(async_url)
+    )
+    async_url = make_url(async_url)
+    async_engine = create_async_engine(async_url, **_engine_options(async_url))
+    sync_engine = create_engine(sync_url, **_engine_options(sync_url))
+    _apply_sqlite_pragmas(async_engine.sync_engine)
+    _apply_sqlite_pragmas(sync_engine)
+    return async_engine, sync_engine
+
+
+async_engine, engine = create_database_engines(settings.DATABASE_URL)
+
+# スクリプト (app/scripts) 用の同期セッション
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# ルートハンドラ用の非同期セッション
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_query_duration.observe(time.perf_counter() - context._query_started_at)
+
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +98,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,31 +1,113 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.sessions import SessionMiddleware
-from app.routes import auth, user, oauth
+import asyncio
+import signal
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.routes import auth, user, oauth, well_known, metrics
 from app.core.config import settings
+from app.core.cors import ClientOriginsCORSMiddleware
+from app.core.keys import published_key_sets, run_rotation
+from app.core.metrics import MetricsMiddleware
+from app.core.templates import precompile_templates
+from app.core.session import ServerSessionMiddleware, create_session_backend
+from app.database import async_engine
+from app.services.client_registry import client_registry
+from app.services.consent_service import create_consent_table
+from app.services.oauth_service import OAuthService
+from app.services.password_service import PasswordHasherBusy, password_hasher
+from app.services.rate_limiter import RateLimitExceeded, rate_limiter
+from app.services.token_store import run_sweeper
 
-app = FastAPI()
 
-allowed_origins = [client["uri"] for client in settings.CLIENTS.values()]
+session_backend = create_session_backend()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 全テンプレートを事前にコンパイル (バイトコードキャッシュがあれば読み込むだけ)
+    precompile_templates()
+    await create_consent_table(async_engine)
+
+    # 期限切れトークン/認可コードの定期掃除
+    tasks = [
+        asyncio.create_task(
+            run_sweeper(
+                [*OAuthService.stores(), session_backend, rate_limiter],
+                settings.TOKEN_STORE_SWEEP_INTERVAL_SECONDS,
+            )
+        )
+    ]
+    # 非対称署名鍵のローテーション
+    for key_set in published_key_sets:
+        if key_set.rotates:
+            tasks.append(
+                asyncio.create_task(
+                    run_rotation(key_set, settings.SIGNING_KEY_CHECK_INTERVAL_SECONDS)
+                )
+            )
+    # SIGHUP でクライアント設定を再読み込みする (再起動不要)
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGHUP, client_registry.reload)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    # ハッシュ処理が混雑している場合は再試行を促す
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests"},
+        headers={"Retry-After": exc.retry_after_header},
+    )
+
+
+# 全てのクライアントのURIを許可 (クライアント設定の再読み込みに追従する)
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allowed_origins,  # 全てのクライアントのURIを許可
+    ClientOriginsCORSMiddleware,
+    registry=client_registry,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# セッションミドルウェアの設定
+# セッションミドルウェアの設定 (CookieにはセッションIDのみを載せる)
 app.add_middleware(
-    SessionMiddleware,
-    secret_key=settings.SECRET_KEY,
+    ServerSessionMiddleware,
+    backend=session_backend,
     session_cookie="__Host-session",
-    max_age=3600,
+    max_age=settings.SESSION_TTL_SECONDS,
     same_site="Lax",
     https_only=True,
 )
 
+# エンドポイントごとのレイテンシ計測 (最も外側で計測する)
+app.add_middleware(
+    MetricsMiddleware,
+    paths=["/oauth/authorize", "/oauth/token", "/oauth/userinfo", "/login"],
+)
+
 app.include_router(auth.router)
 app.include_router(oauth.router)
 app.include_router(user.router)
+app.include_router(well_known.router)
+app.include_router(metrics.router)
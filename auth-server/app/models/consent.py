@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class Consent(Base):
+    """ユーザーがクライアントに許可したスコープ"""
+
+    __tablename__ = "consents"
+    # (user_id, client_id) の一意索引で1回の検索で引けるようにする
+    __table_args__ = (UniqueConstraint("user_id", "client_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    client_id = Column(String, nullable=False)
+    scope = Column(String, nullable=False)  # スペース区切り
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
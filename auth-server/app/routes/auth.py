@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Request, Depends, Form
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models.user import User
-from app.core.security import get_password_hash, verify_password
+from app.services.password_service import password_hasher
+from app.services.rate_limiter import client_ip, rate_limiter
+from app.services.user_cache import CachedUser, get_user_by_username, user_cache
 from app.core.templates import templates
 from urllib.parse import urlencode
 
@@ -32,10 +36,27 @@ async def login(
     username: str = Form(...),
     password: str = Form(...),
     next: str = Form("/"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password):
+    # DB検索やbcryptの前に、アドレスごとの試行回数を制限する
+    rate_limiter.check(login_ip=client_ip(request))
+
+    # 存在しないユーザー名も否定キャッシュにより、繰り返しではDBを検索しない。
+    # ただしこのセッションで登録したユーザー名は、別のワーカーに残った否定エントリを使わない
+    user = await get_user_by_username(
+        db,
+        username,
+        trust_missing=request.session.get("registered_username") != username,
+    )
+    verified, new_hash = (
+        await password_hasher.verify_and_update(password, user.password)
+        if user
+        else (False, None)
+    )
+    if not verified:
+        # ユーザー名ごとの制限は失敗したログインだけに課す。成功したログインも
+        # 数えると、誤ったパスワードを送り続けるだけで本人を締め出せてしまう
+        rate_limiter.check(login_username=username)
         return templates.TemplateResponse(
             "login.html",
             {
@@ -45,6 +66,14 @@ async def login(
             status_code=400,
         )
 
+    if new_hash:
+        # ハッシュ方式やコストが変更されていれば、新しい設定で保存し直す
+        await db.execute(
+            update(User).where(User.id == user.id).values(password=new_hash)
+        )
+        await db.commit()
+        user_cache.invalidate(user_id=user.id)
+
     request.session["user"] = {"id": user.id, "username": user.username}
 
     # OAuth状態のチェックとリダイレクト処理
@@ -58,6 +87,8 @@ async def login(
         }
         if oauth_state.get("state"):
             query_params["state"] = oauth_state["state"]
+        if oauth_state.get("nonce"):
+            query_params["nonce"] = oauth_state["nonce"]
 
         redirect_url = f"/oauth/authorize?{urlencode(query_params)}"
         return RedirectResponse(redirect_url, status_code=303)
@@ -75,21 +106,30 @@ async def register(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    if db.query(User).filter(User.username == username).first():
+    # 重複の確認は一意制約に任せる (キャッシュ済みの既存ユーザーのみ事前に弾く)
+    user = None
+    if not isinstance(user_cache.get(("username", username)), CachedUser):
+        user = User(username=username, password=await password_hasher.hash(password))
+        db.add(user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            user = None
+    if user is None:
         return templates.TemplateResponse(
             "register.html",
             {"request": request, "error": "このユーザー名は既に使用されています"},
             status_code=400,
         )
-
-    user = User(username=username, password=get_password_hash(password))
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.refresh(user)
+    # 否定キャッシュに残っている「存在しない」を消す
+    user_cache.invalidate(username=username)
 
     request.session["user"] = {"id": user.id, "username": user.username}
+    request.session["registered_username"] = user.username
     next_url = request.query_params.get("next", "/")
     return RedirectResponse(next_url, status_code=303)
 
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Request, HTTPException, Depends, Form, Query
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request, HTTPException, Depends, Form, Query, Response
+from fastapi.responses import JSONResponse, RedirectResponse
+from pydantic import BaseModel, Field
+from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.client_registry import client_registry
+from app.services.consent_service import get_granted_scopes, remember_consent
 from app.services.oauth_service import OAuthService
+from app.services.rate_limiter import client_ip, rate_limiter
+from app.services.token_store import run_store_io
 from app.core.config import settings
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User
 from urllib.parse import urlencode
 from app.core.templates import templates
 from app.core.security import generate_csrf_token, verify_csrf_token
+from app.core.http_cache import cached_json_response
+from app.services.user_cache import get_user_by_id
+from app.services.userinfo_cache import userinfo_cache
 import httpx
 
 router = APIRouter(prefix="/oauth", tags=["OAuth認証"])
@@ -21,18 +31,21 @@ async def authorize(
     redirect_uri: str = Query(...),
     state: str = Query(None),
     scope: str = Query(...),
+    nonce: str = Query(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user = request.session.get("user")
     if not user:
         return RedirectResponse("/login?next=/oauth/authorize", status_code=303)
 
-    if client_id not in settings.CLIENTS:
+    client = client_registry.get(client_id)
+    if not client:
         return RedirectResponse(
             f"{redirect_uri}?error=unauthorized_client",
             status_code=303,
         )
 
-    if redirect_uri != settings.CLIENTS[client_id]["redirect_uri"]:
+    if not client.allows_redirect_uri(redirect_uri):
         return RedirectResponse(
             f"{redirect_uri}?error=invalid_redirect_uri",
             status_code=303,
@@ -52,14 +65,20 @@ async def authorize(
             status_code=303,
         )
 
-    client_allowed_scopes = set(settings.CLIENTS[client_id]["allowed_scopes"])
-    unauthorized_scopes = requested_scopes - client_allowed_scopes
+    unauthorized_scopes = requested_scopes - client.allowed_scopes
     if unauthorized_scopes:
         return RedirectResponse(
             f"{redirect_uri}?error=insufficient_scope&error_description=Client+not+authorized+for+scopes:{'+'.join(unauthorized_scopes)}",
             status_code=303,
         )
 
+    # 要求されたスコープをすべて許可済みなら同意画面を省略する
+    granted_scopes = await get_granted_scopes(db, user["id"], client_id)
+    if requested_scopes <= granted_scopes:
+        return await _redirect_with_code(
+            client_id, user["id"], redirect_uri, scope, state, nonce
+        )
+
     # OAuth認可フローの状態を保存
     request.session["oauth_state"] = {
         "response_type": response_type,
@@ -67,6 +86,7 @@ async def authorize(
         "redirect_uri": redirect_uri,
         "state": state,
         "scope": scope,
+        "nonce": nonce,
     }
 
     csrf_token = generate_csrf_token()
@@ -87,6 +107,7 @@ async def authorize_action(
     request: Request,
     csrf_token: str = Form(...),
     action: str = Form(...),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if not verify_csrf_token(csrf_token, request.session["csrf_token"]):
         raise HTTPException(status_code=400, detail="Invalid CSRF token")
@@ -99,6 +120,7 @@ async def authorize_action(
     redirect_uri = oauth_state.get("redirect_uri")
     scope = oauth_state.get("scope")
     state = oauth_state.get("state")
+    nonce = oauth_state.get("nonce")
 
     if not all([client_id, redirect_uri, scope]):
         request.session.pop("oauth_state", None)
@@ -115,12 +137,31 @@ async def authorize_action(
             params["state"] = state
         return RedirectResponse(f"{redirect_uri}?{urlencode(params)}", status_code=303)
 
+    # 次回以降は同意画面を省略できるように保存する
+    user_id = request.session["user"]["id"]
+    await remember_consent(db, user_id, client_id, set(scope.split()))
+
+    return await _redirect_with_code(
+        client_id, user_id, redirect_uri, scope, state, nonce
+    )
+
+
+async def _redirect_with_code(
+    client_id: str,
+    user_id: int,
+    redirect_uri: str,
+    scope: str,
+    state: str,
+    nonce: str = None,
+) -> RedirectResponse:
     # 認可コード生成
-    code = OAuthService.generate_authorization_code(
+    code = await run_store_io(
+        OAuthService.generate_authorization_code,
         client_id=client_id,
-        user_id=request.session["user"]["id"],
+        user_id=user_id,
         redirect_uri=redirect_uri,
         scope=scope,
+        nonce=nonce,
     )
 
     params = {"code": code}
@@ -133,35 +174,139 @@ async def authorize_action(
     )
 
 
+def _token_error(error: str, description: str, status_code: int = 400):
+    """RFC 6749 5.2 形式のトークンエンドポイントのエラー"""
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": error, "error_description": description},
+    )
+
+
 @router.post("/token")
 async def token(
+    request: Request,
     client_id: str = Form(...),
     client_secret: str = Form(...),
-    code: str = Form(...),
-    redirect_uri: str = Form(...),
     grant_type: str = Form(...),
+    code: str = Form(None),
+    redirect_uri: str = Form(None),
+    refresh_token: str = Form(None),
+    scope: str = Form(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # クライアント認証
-    if (
-        client_id not in settings.CLIENTS
-        or client_secret != settings.CLIENTS[client_id]["client_secret"]
-    ):
-        raise HTTPException(status_code=401, detail="Invalid client authentication")
+    # クライアントシークレットの総当たりを防ぐため、認証の前にアドレスごとに制限する
+    rate_limiter.check(token_ip=client_ip(request))
 
-    if grant_type != "authorization_code":
-        raise HTTPException(status_code=400, detail="Unsupported grant type")
+    # クライアント認証
+    client = client_registry.authenticate(client_id, client_secret)
+    if not client:
+        # クライアントごとの制限は認証の失敗だけに課す。client_id は公開されて
+        # いるため、認証前に数えると誰でも正規のクライアントの枠を使い切れる
+        rate_limiter.check(token_client=client_id)
+        return _token_error("invalid_client", "Invalid client authentication", 401)
 
-    # 認可コードの検証とトークンの生成
     try:
-        return OAuthService.exchange_code_for_token(
-            code=code, client_id=client_id, redirect_uri=redirect_uri
-        )
+        if grant_type == "authorization_code":
+            if not code or not redirect_uri:
+                return _token_error(
+                    "invalid_request", "code and redirect_uri are required"
+                )
+            # 認可コードの検証とトークンの生成
+            code_data = await run_store_io(
+                OAuthService.redeem_authorization_code,
+                code=code,
+                client_id=client_id,
+                redirect_uri=redirect_uri,
+            )
+            user = None
+            if "openid" in code_data["scope"].split():
+                # IDトークンのクレームはログイン時に読み込んだユーザー行 (キャッシュ) から作る
+                user = await get_user_by_id(db, code_data["user_id"])
+            return await run_store_io(
+                OAuthService.issue_code_tokens,
+                code_data,
+                id_token_user=user,
+            )
+
+        if grant_type == "refresh_token":
+            if not refresh_token:
+                return _token_error("invalid_request", "refresh_token is required")
+            # リフレッシュトークンのローテーション
+            return await run_store_io(
+                OAuthService.refresh_access_token,
+                refresh_token=refresh_token,
+                client_id=client_id,
+                scope=scope,
+            )
+
+        if grant_type == "client_credentials":
+            # サービス間通信用: クライアント自身の権限でトークンを発行する
+            return await run_store_io(
+                OAuthService.issue_client_credentials_token,
+                client_id=client_id,
+                allowed_scopes=client.allowed_scopes,
+                scope=scope,
+            )
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        # client_credentials の拒否理由は要求スコープのみ
+        if grant_type == "client_credentials":
+            return _token_error("invalid_scope", str(e))
+        return _token_error("invalid_grant", str(e))
+
+    return _token_error("unsupported_grant_type", "Unsupported grant type")
+
+
+class BulkIntrospectionRequest(BaseModel):
+    client_id: str
+    client_secret: str
+    tokens: List[str] = Field(max_length=settings.INTROSPECTION_BULK_MAX_TOKENS)
+
+
+@router.post("/introspect")
+async def introspect(
+    client_id: str = Form(...),
+    client_secret: str = Form(...),
+    token: str = Form(...),
+    token_type_hint: str = Form(None),
+):
+    # RFC 7662: 呼び出し元のクライアント認証を必須とする
+    if not client_registry.authenticate(client_id, client_secret):
+        raise HTTPException(status_code=401, detail="Invalid client authentication")
+
+    return await run_store_io(OAuthService.introspect, token)
+
+
+@router.post("/introspect/bulk")
+async def introspect_bulk(body: BulkIntrospectionRequest):
+    # 複数トークンを1リクエストで検証する (結果はリクエストと同じ順序)
+    if not client_registry.authenticate(body.client_id, body.client_secret):
+        raise HTTPException(status_code=401, detail="Invalid client authentication")
+
+    results = await run_store_io(
+        lambda: [OAuthService.introspect(token) for token in body.tokens]
+    )
+    return {"results": results}
+
+
+@router.post("/revoke")
+async def revoke(
+    client_id: str = Form(...),
+    client_secret: str = Form(...),
+    token: str = Form(...),
+    token_type_hint: str = Form(None),
+):
+    if not client_registry.authenticate(client_id, client_secret):
+        raise HTTPException(status_code=401, detail="Invalid client authentication")
+
+    # RFC 7009: 無効なトークンでも200を返す
+    await run_store_io(OAuthService.revoke_token, token, client_id)
+    return Response(status_code=200)
 
 
 @router.get("/userinfo")
-async def userinfo_endpoint(request: Request, db: Session = Depends(get_db)):
+async def userinfo_endpoint(
+    request: Request, db: AsyncSession = Depends(get_async_db)
+):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
@@ -169,25 +314,31 @@ async def userinfo_endpoint(request: Request, db: Session = Depends(get_db)):
     token = auth_header.split(" ")[1]
     try:
         # profileスコープの検証
-        token_data = OAuthService.validate_token(token, required_scope="profile")
-        user = db.query(User).filter(User.id == token_data["user_id"]).first()
-
-        # OpenID Connect
-        response_data = {
-            "sub": user.sub,
-            "name": user.username,
-            "preferred_username": user.username,
-            "updated_at": int(user.updated_at.timestamp()),
-        }
-
-        # emailスコープがある場合
-        token_scopes = set(token_data["scope"].split())
-        if "email" in token_scopes and user.email:
-            response_data.update(
-                {"email": user.email, "email_verified": user.email_verified}
-            )
-
-        return response_data
+        token_data = await run_store_io(
+            OAuthService.validate_token, token, required_scope="profile"
+        )
+        user_id = token_data["user_id"]
+        if user_id is None:
+            # client_credentials のトークンにはユーザー情報がない
+            raise ValueError("Token is not associated with a user")
+        scopes = frozenset(token_data["scope"].split())
+
+        # 更新日時のみを取得し、変更がなければキャッシュ済みのレスポンスを使う
+        result = await db.execute(select(User.updated_at).where(User.id == user_id))
+        updated_at = result.scalar_one_or_none()
+        if updated_at is None:
+            raise ValueError("User not found")
+
+        entry = userinfo_cache.get(user_id, scopes, updated_at)
+        if entry is None:
+            user = await get_user_by_id(db, user_id, updated_at)
+            if not user:
+                raise ValueError("User not found")
+            entry = userinfo_cache.build(user, scopes)
+
+        return cached_json_response(
+            request, entry.body, entry.etag, "private, no-cache"
+        )
     except ValueError as e:
         raise HTTPException(status_code=401, detail=str(e))
 
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Request
+from app.core.config import settings
+from app.core.http_cache import cached_json_response
+from app.core.keys import published_jwks
+from app.services.discovery import discovery_document
+
+router = APIRouter(prefix="/.well-known", tags=["ディスカバリー"])
+
+
+@router.get("/jwks.json")
+async def jwks(request: Request):
+    body, etag = published_jwks()
+    return cached_json_response(
+        request,
+        body,
+        etag,
+        f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}",
+    )
+
+
+@router.get("/openid-configuration")
+async def openid_configuration(request: Request):
+    return cached_json_response(
+        request,
+        discovery_document.body,
+        discovery_document.etag,
+        f"public, max-age={settings.DISCOVERY_MAX_AGE_SECONDS}",
+    )
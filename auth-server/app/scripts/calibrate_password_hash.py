@@ -0,0 +1,83 @@
+"""パスワードハッシュのコストを実行ホストに合わせて調整する
+
+候補のコストごとに検証時間を計測し、目標時間に収まる最大のコストを
+環境変数の形式で提案する。
+
+    poetry run python -m app.scripts.calibrate_password_hash --target-ms 250
+    poetry run python -m app.scripts.calibrate_password_hash --scheme argon2
+"""
+
+import argparse
+import time
+from app.core.config import settings
+from app.core.security import PASSWORD_SCHEMES, build_password_context
+
+PASSWORD = "calibration-password"
+
+
+def measure(context, samples: int) -> float:
+    """1回の検証にかかる時間 (秒) の中央値を返す"""
+    hashed = context.hash(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        began = time.perf_counter()
+        context.verify(PASSWORD, hashed)
+        timings.append(time.perf_counter() - began)
+    return sorted(timings)[len(timings) // 2]
+
+
+def candidates(args):
+    """(設定, CryptContext) をコストの小さい順に返す"""
+    if args.scheme == "bcrypt":
+        for rounds in range(8, 17):
+            yield {"PASSWORD_BCRYPT_ROUNDS": rounds}, build_password_context(
+                "bcrypt",
+                bcrypt_rounds=rounds,
+                argon2_time_cost=settings.PASSWORD_ARGON2_TIME_COST,
+                argon2_memory_cost=settings.PASSWORD_ARGON2_MEMORY_COST,
+                argon2_parallelism=settings.PASSWORD_ARGON2_PARALLELISM,
+            )
+    else:
+        # メモリコストは固定し、時間コスト (反復回数) で調整する
+        memory_cost = args.memory_mib * 1024
+        for time_cost in range(1, 11):
+            yield {
+                "PASSWORD_ARGON2_TIME_COST": time_cost,
+                "PASSWORD_ARGON2_MEMORY_COST": memory_cost,
+                "PASSWORD_ARGON2_PARALLELISM": args.parallelism,
+            }, build_password_context(
+                "argon2",
+                bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+                argon2_time_cost=time_cost,
+                argon2_memory_cost=memory_cost,
+                argon2_parallelism=args.parallelism,
+            )
+
+
+def calibrate(args) -> None:
+    target = args.target_ms / 1000
+    suggestion = None
+    for params, context in candidates(args):
+        elapsed = measure(context, args.samples)
+        print(f"{params}: {elapsed * 1000:.1f} ms")
+        if elapsed > target:
+            break
+        suggestion = params
+
+    if suggestion is None:
+        print(f"目標 {args.target_ms} ms に収まる候補がありません")
+        return
+    print(f"\n推奨設定 (目標 {args.target_ms} ms 以内):")
+    print(f"PASSWORD_SCHEME={args.scheme}")
+    for name, value in suggestion.items():
+        print(f"{name}={value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scheme", choices=PASSWORD_SCHEMES, default=settings.PASSWORD_SCHEME)
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--memory-mib", type=int, default=64)
+    parser.add_argument("--parallelism", type=int, default=settings.PASSWORD_ARGON2_PARALLELISM)
+    calibrate(parser.parse_args())
@@ -1,6 +1,6 @@
 from app.database import get_db
 from app.models.user import User
-from app.core.security import get_password_hash
+from app.services.password_service import password_hasher
 import uuid
 
 
@@ -8,18 +8,21 @@ def create_test_users():
     print("テストユーザー作成開始")
     db = next(get_db())
 
+    # パスワードはスレッドプールで並列にハッシュ化する
+    test1_password, test2_password = password_hasher.hash_many(["test1", "test2"])
+
     # テストユーザーの作成
     test_users = [
         {
             "username": "test1",
-            "password": get_password_hash("test1"),
+            "password": test1_password,
             "email": "test1@example.com",
             "email_verified": True,
             "sub": str(uuid.uuid4()),
         },
         {
             "username": "test2",
-            "password": get_password_hash("test2"),
+            "password": test2_password,
             "email": "test2@example.com",
             "email_verified": False,
             "sub": str(uuid.uuid4()),
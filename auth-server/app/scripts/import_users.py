@@ -0,0 +1,173 @@
+"""ユーザーの一括インポート
+
+CSV または NDJSON からユーザーを1件ずつ読み込み、チャンク単位で
+プロセスプールでパスワードをハッシュ化して一括INSERTする。
+ハッシュ化済みのパスワードは password_hash 列で指定できる。
+既存ユーザー (username / email / sub の重複) は ON CONFLICT DO NOTHING で読み飛ばす。
+
+処理済み件数はチャンクのコミットごとにチェックポイントファイルへ記録し、
+--resume で中断した位置から再開できる。
+
+    poetry run python -m app.scripts.import_users users.csv --workers 8
+    poetry run python -m app.scripts.import_users users.ndjson --resume
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from app.core.security import get_password_hash
+from app.models.user import User
+
+
+def read_records(path: str) -> Iterator[Dict[str, str]]:
+    """拡張子 (.csv / .ndjson / .jsonl) に応じてレコードを1件ずつ返す"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported input format: {path}")
+
+
+def chunked(records: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(records)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def hash_chunk(executor: ProcessPoolExecutor, chunk: List[dict], workers: int):
+    """平文パスワードのハッシュ化をプロセスプールに投入する"""
+    plaintext = [r["password"] for r in chunk if not r.get("password_hash")]
+    return executor.map(
+        get_password_hash, plaintext, chunksize=max(1, len(plaintext) // workers)
+    )
+
+
+def to_rows(chunk: List[dict], hashes: Iterator[str]) -> List[dict]:
+    rows = []
+    for record in chunk:
+        rows.append(
+            {
+                "username": record["username"],
+                "password": record.get("password_hash") or next(hashes),
+                "email": record.get("email") or None,
+                "email_verified": _to_bool(record.get("email_verified", False)),
+                # executemany は全行で同じ列を要求するため、sub のない行も埋める
+                "sub": record.get("sub") or str(uuid.uuid4()),
+            }
+        )
+    return rows
+
+
+def _insert_ignoring_conflicts(engine: Engine):
+    # 1行ずつ存在確認する代わりに、重複はデータベース側で読み飛ばす
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(User).on_conflict_do_nothing()
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(User).on_conflict_do_nothing()
+    return insert(User).prefix_with("IGNORE")  # MySQL
+
+
+def _load_checkpoint(path: str, input_path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["input"] != os.path.abspath(input_path):
+        raise ValueError(f"Checkpoint {path} belongs to {checkpoint['input']}")
+    return checkpoint["records"]
+
+
+def _save_checkpoint(path: str, input_path: str, records: int) -> None:
+    # 書き込み途中で中断しても壊れないように置き換えで保存する
+    with open(path + ".tmp", "w") as f:
+        json.dump({"input": os.path.abspath(input_path), "records": records}, f)
+    os.replace(path + ".tmp", path)
+
+
+def import_users(
+    input_path: str,
+    engine: Optional[Engine] = None,
+    chunk_size: int = 1000,
+    workers: int = os.cpu_count() or 1,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    progress=sys.stderr,
+) -> dict:
+    if engine is None:
+        from app.database import engine
+    checkpoint_path = checkpoint_path or input_path + ".checkpoint"
+    skip = _load_checkpoint(checkpoint_path, input_path) if resume else 0
+
+    statement = _insert_ignoring_conflicts(engine)
+    records = itertools.islice(read_records(input_path), skip, None)
+    processed, inserted = skip, 0
+    began = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = chunked(records, chunk_size)
+        pending = None
+        # 次のチャンクのハッシュ化と現在のチャンクのINSERTを並行させる
+        for chunk in itertools.chain(chunks, [None]):
+            submitted = (chunk, hash_chunk(executor, chunk, workers)) if chunk else None
+            if pending:
+                done_chunk, hashes = pending
+                rows = to_rows(done_chunk, iter(hashes))
+                with engine.begin() as conn:
+                    inserted += conn.execute(statement, rows).rowcount
+                processed += len(done_chunk)
+                _save_checkpoint(checkpoint_path, input_path, processed)
+                elapsed = time.perf_counter() - began
+                print(
+                    f"{processed} records processed, {inserted} inserted"
+                    f" ({(processed - skip) / elapsed:.0f} records/s)",
+                    file=progress,
+                    flush=True,
+                )
+            pending = submitted
+
+    return {
+        "processed": processed - skip,
+        "inserted": inserted,
+        "skipped": processed - skip - inserted,
+        "resumed_from": skip,
+        "seconds": time.perf_counter() - began,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", help="CSV または NDJSON ファイル")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", help="既定は <input>.checkpoint")
+    parser.add_argument("--resume", action="store_true", help="チェックポイントから再開する")
+    args = parser.parse_args()
+
+    result = import_users(
+        args.input,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+    )
+    print(json.dumps(result))
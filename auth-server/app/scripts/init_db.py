@@ -1,4 +1,5 @@
 from app.database import Base, engine
+from app.models import consent  # noqa: F401 テーブル定義の登録
 from app.scripts.create_test_users import create_test_users
 
 
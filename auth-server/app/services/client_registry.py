@@ -0,0 +1,100 @@
+import hashlib
+import hmac
+from typing import Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional
+from app.core.config import Settings, settings
+
+
+def hash_client_secret(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+
+class ClientPolicy(NamedTuple):
+    """起動時に設定から組み立てる、クライアントごとの不変な検証ポリシー"""
+
+    client_id: str
+    name: str
+    uri: str
+    redirect_uris: FrozenSet[str]
+    allowed_scopes: FrozenSet[str]
+    secret_hash: bytes
+
+    def verify_secret(self, client_secret: str) -> bool:
+        return hmac.compare_digest(hash_client_secret(client_secret), self.secret_hash)
+
+    def allows_redirect_uri(self, redirect_uri: str) -> bool:
+        return redirect_uri in self.redirect_uris
+
+
+def compile_client(client_id: str, config: dict) -> ClientPolicy:
+    # redirect_uris (複数) と従来の redirect_uri (単一) の両方を受け付ける
+    redirect_uris = set(config.get("redirect_uris", []))
+    if config.get("redirect_uri"):
+        redirect_uris.add(config["redirect_uri"])
+
+    # 平文の client_secret の代わりに SHA-256 の16進表記も指定できる
+    if config.get("client_secret_hash"):
+        secret_hash = bytes.fromhex(config["client_secret_hash"])
+    else:
+        secret_hash = hash_client_secret(config["client_secret"])
+
+    return ClientPolicy(
+        client_id=client_id,
+        name=config.get("name", client_id),
+        uri=config.get("uri", ""),
+        redirect_uris=frozenset(redirect_uris),
+        allowed_scopes=frozenset(config.get("allowed_scopes", [])),
+        secret_hash=secret_hash,
+    )
+
+
+class ClientRegistry:
+    """クライアント設定を一度だけ組み立てて保持する
+
+    reload() で設定を読み直すと、組み立て済みの辞書を丸ごと差し替える。
+    """
+
+    # 存在しないクライアントでも同じ比較処理を行うためのダミー
+    _DUMMY_SECRET_HASH = hash_client_secret("")
+
+    def __init__(self, clients: Dict[str, dict]):
+        self._clients = self._compile(clients)
+        self._listeners: List[Callable[[], None]] = []
+
+    def __iter__(self) -> Iterator[ClientPolicy]:
+        return iter(self._clients.values())
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, client_id: str) -> Optional[ClientPolicy]:
+        return self._clients.get(client_id)
+
+    def authenticate(self, client_id: str, client_secret: str) -> Optional[ClientPolicy]:
+        client = self._clients.get(client_id)
+        if client is None:
+            hmac.compare_digest(
+                hash_client_secret(client_secret), self._DUMMY_SECRET_HASH
+            )
+            return None
+        return client if client.verify_secret(client_secret) else None
+
+    def on_reload(self, listener: Callable[[], None]) -> None:
+        self._listeners.append(listener)
+
+    def reload(self, clients: Optional[Dict[str, dict]] = None) -> None:
+        """設定 (環境変数 / .env) を読み直してクライアント定義を差し替える"""
+        if clients is None:
+            clients = settings.CLIENTS = Settings().CLIENTS
+        self._clients = self._compile(clients)
+        for listener in self._listeners:
+            listener()
+
+    @staticmethod
+    def _compile(clients: Dict[str, dict]) -> Dict[str, ClientPolicy]:
+        return {
+            client_id: compile_client(client_id, config)
+            for client_id, config in clients.items()
+        }
+
+
+client_registry = ClientRegistry(settings.CLIENTS)
@@ -0,0 +1,57 @@
+from typing import FrozenSet, Set
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.models.consent import Consent
+
+
+async def create_consent_table(engine: AsyncEngine) -> None:
+    """consents テーブルがなければ作成する (導入前に init_db したDB向け)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Consent.__table__.create, checkfirst=True)
+
+
+async def get_granted_scopes(
+    db: AsyncSession, user_id: int, client_id: str
+) -> FrozenSet[str]:
+    """ユーザーがクライアントに許可済みのスコープを返す"""
+    result = await db.execute(
+        select(Consent.scope).where(
+            Consent.user_id == user_id, Consent.client_id == client_id
+        )
+    )
+    scope = result.scalar_one_or_none()
+    return frozenset(scope.split()) if scope else frozenset()
+
+
+async def remember_consent(
+    db: AsyncSession, user_id: int, client_id: str, scopes: Set[str]
+) -> None:
+    """許可したスコープを既存の同意に追加して保存する"""
+    try:
+        await _save_consent(db, user_id, client_id, scopes)
+    except IntegrityError:
+        # 並行するリクエストが先に同意を作成した場合は、その行に追加し直す
+        await db.rollback()
+        await _save_consent(db, user_id, client_id, scopes)
+
+
+async def _save_consent(
+    db: AsyncSession, user_id: int, client_id: str, scopes: Set[str]
+) -> None:
+    result = await db.execute(
+        select(Consent).where(
+            Consent.user_id == user_id, Consent.client_id == client_id
+        )
+    )
+    consent = result.scalars().first()
+    if consent:
+        granted = set(consent.scope.split()) | scopes
+        consent.scope = " ".join(sorted(granted))
+    else:
+        db.add(
+            Consent(
+                user_id=user_id, client_id=client_id, scope=" ".join(sorted(scopes))
+            )
+        )
+    await db.commit()
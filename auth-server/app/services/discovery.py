@@ -0,0 +1,60 @@
+import hashlib
+import json
+from app.core.config import settings
+
+# userinfo で返すクレーム (build_userinfo_claims と対応)
+CLAIMS_SUPPORTED = [
+    "sub",
+    "name",
+    "preferred_username",
+    "updated_at",
+    "email",
+    "email_verified",
+]
+
+
+def build_discovery_document() -> dict:
+    """OpenID Connect Discovery 1.0 のプロバイダーメタデータを設定から組み立てる"""
+    issuer = settings.ISSUER
+    return {
+        "issuer": issuer,
+        "authorization_endpoint": f"{issuer}/oauth/authorize",
+        "token_endpoint": f"{issuer}/oauth/token",
+        "userinfo_endpoint": f"{issuer}/oauth/userinfo",
+        "introspection_endpoint": f"{issuer}/oauth/introspect",
+        "revocation_endpoint": f"{issuer}/oauth/revoke",
+        "jwks_uri": f"{issuer}/.well-known/jwks.json",
+        "scopes_supported": sorted(settings.AVAILABLE_SCOPES),
+        "response_types_supported": ["code"],
+        "response_modes_supported": ["query"],
+        "grant_types_supported": [
+            "authorization_code",
+            "refresh_token",
+            "client_credentials",
+        ],
+        "subject_types_supported": ["public"],
+        # IDトークンは常に RS256 (OIDC Discovery で必須) で署名する
+        "id_token_signing_alg_values_supported": ["RS256"],
+        "token_endpoint_auth_methods_supported": ["client_secret_post"],
+        "claims_supported": CLAIMS_SUPPORTED,
+    }
+
+
+class DiscoveryDocument:
+    """シリアライズ済みのディスカバリー文書
+
+    リクエストごとには組み立てず、起動時にのみ生成する。
+    内容は再読み込みの対象外の設定 (ISSUER, AVAILABLE_SCOPES) のみから作る。
+    """
+
+    def __init__(self):
+        self.refresh()
+
+    def refresh(self) -> None:
+        body = json.dumps(build_discovery_document(), separators=(",", ":")).encode()
+        # 内容のハッシュによる強いETag (バイト単位で同一なら一致する)
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.body = body
+
+
+discovery_document = DiscoveryDocument()
@@ -1,70 +1,384 @@
 from datetime import datetime, timedelta
+from functools import wraps
 import secrets
-from typing import Dict
+from typing import FrozenSet, Optional
+from app.core.config import settings
+from app.core.metrics import (
+    CallbackMetric,
+    registry,
+    token_rejections,
+    tokens_issued,
+    tokens_reused,
+)
+from app.core.tokens import (
+    access_token_lifetime,
+    decode_access_token,
+    encode_access_token,
+    encode_id_token,
+    id_token_lifetime,
+    is_jwt,
+    open_authorization_code,
+    seal_authorization_code,
+)
+from app.services.revocation import RevocationList
+from app.services.token_store import create_token_store
+from app.services.userinfo_cache import build_userinfo_claims
+
+
+def _instrumented(operation: str, grant_type: str = None):
+    """発行件数と、ValueError のメッセージ別の拒否件数を記録する"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                result = func(*args, **kwargs)
+            except ValueError as e:
+                token_rejections.inc(operation, str(e))
+                raise
+            if grant_type:
+                tokens_issued.inc(grant_type)
+            return result
+
+        return wrapper
+
+    return decorator
 
 
 class OAuthService:
-    _auth_codes: Dict[str, dict] = {}  # 認可コードの一時保存
-    _tokens: Dict[str, dict] = {}  # アクセストークンの保存
+    # 認可コードの一時保存
+    _auth_codes = create_token_store("auth_codes")
+    # 使用済みの sealed 認可コードのID (コードの有効期限まで保持する)
+    # 追い出されると再利用を検出できなくなるため上限を設けない
+    _redeemed_codes = create_token_store("redeemed_codes", capped=False)
+    # アクセストークンの保存
+    _tokens = create_token_store("tokens")
+    # リフレッシュトークンの保存 (トークンファミリー単位の索引付き)
+    _refresh_tokens = create_token_store("refresh_tokens")
+    # client_credentials で発行したトークンの再利用キャッシュ
+    _client_tokens = create_token_store("client_tokens")
+    # 失効済みJWTの jti (トークンの有効期限まで保持する)
+    # 追い出されると失効したトークンが再び有効になるため上限を設けない
+    _revoked_jtis = RevocationList(create_token_store("revoked_jtis", capped=False))
 
     @classmethod
     def generate_authorization_code(
-        cls, client_id: str, user_id: str, redirect_uri: str, scope: str
+        cls,
+        client_id: str,
+        user_id: str,
+        redirect_uri: str,
+        scope: str,
+        nonce: Optional[str] = None,
     ) -> str:
-        code = secrets.token_urlsafe(32)
-        cls._auth_codes[code] = {
+        expires_at = datetime.now() + timedelta(minutes=10)
+        code_data = {
             "client_id": client_id,
             "user_id": user_id,
             "redirect_uri": redirect_uri,
             "scope": scope,
-            "expires_at": datetime.now() + timedelta(minutes=10),
         }
+        if nonce is not None:
+            # IDトークンにそのまま載せる (OpenID Connect のリプレイ対策)
+            code_data["nonce"] = nonce
+
+        if settings.AUTHORIZATION_CODE_FORMAT == "sealed":
+            # 内容をコード自体に暗号化して格納し、サーバー側には保存しない
+            return seal_authorization_code(
+                {**code_data, "exp": int(expires_at.timestamp())}
+            )
+
+        code = secrets.token_urlsafe(32)
+        cls._auth_codes.set(code, {**code_data, "expires_at": expires_at}, expires_at)
         return code
 
     @classmethod
     def exchange_code_for_token(
         cls, code: str, client_id: str, redirect_uri: str
     ) -> dict:
-        # 認可コードの検証
-        code_data = cls._auth_codes.get(code)
-        if not code_data:
-            raise ValueError("Invalid authorization code")
+        """認可コードを検証してトークンを発行する (IDトークンは含めない)"""
+        return cls.issue_code_tokens(
+            cls.redeem_authorization_code(code, client_id, redirect_uri)
+        )
+
+    @classmethod
+    @_instrumented("exchange_code_for_token")
+    def redeem_authorization_code(
+        cls, code: str, client_id: str, redirect_uri: str
+    ) -> dict:
+        """認可コードを検証して使用済みにし、コードの内容を返す"""
+        if settings.AUTHORIZATION_CODE_FORMAT == "sealed":
+            code_data = cls._redeem_sealed_code(code)
+        else:
+            # 認可コードの検証 (取り出しと同時に削除し、ワーカー間でも単一使用にする)
+            code_data = cls._auth_codes.pop(code)
+            if not code_data:
+                raise ValueError("Invalid authorization code")
         if code_data["client_id"] != client_id:
             raise ValueError("Client ID mismatch")
         if code_data["redirect_uri"] != redirect_uri:
             raise ValueError("Redirect URI mismatch")
         if datetime.now() > code_data["expires_at"]:
             raise ValueError("Authorization code expired")
+        return code_data
 
-        # アクセストークン生成
-        token = secrets.token_urlsafe(32)
-        expires_at = datetime.now() + timedelta(hours=1)
+    @classmethod
+    @_instrumented("exchange_code_for_token", grant_type="authorization_code")
+    def issue_code_tokens(
+        cls,
+        code_data: dict,
+        id_token_user=None,
+    ) -> dict:
+        """使用済みにした認可コードの内容からトークンを発行する
 
-        # トークンデータの保存
-        cls._tokens[token] = {
-            "client_id": client_id,
-            "user_id": code_data["user_id"],
-            "scope": code_data["scope"],
-            "expires_at": expires_at,
-        }
+        openid スコープがあり id_token_user (読み込み済みのユーザー行) が
+        渡された場合は、許可されたスコープのクレームを載せたIDトークンも返す。
+        """
+        client_id = code_data["client_id"]
+        # 認可コードごとに新しいトークンファミリーを開始する
+        family = secrets.token_urlsafe(16)
+        token_response = cls._issue_access_token(
+            client_id=client_id,
+            user_id=code_data["user_id"],
+            scope=code_data["scope"],
+            family=family,
+        )
+        token_response["refresh_token"] = cls._issue_refresh_token(
+            client_id=client_id,
+            user_id=code_data["user_id"],
+            scope=code_data["scope"],
+            family=family,
+        )
+
+        scopes = frozenset(code_data["scope"].split())
+        if "openid" in scopes and id_token_user is not None:
+            token_response["id_token"] = encode_id_token(
+                client_id=client_id,
+                claims=build_userinfo_claims(id_token_user, scopes),
+                expires_at=datetime.now() + id_token_lifetime(),
+                nonce=code_data.get("nonce"),
+            )
+        return token_response
+
+    @classmethod
+    def _redeem_sealed_code(cls, code: str) -> dict:
+        """sealed 認可コードを復号し、コードIDの登録で単一使用を保証する"""
+        code_id, code_data = open_authorization_code(code)
+        expires_at = datetime.fromtimestamp(code_data.pop("exp"))
+        if datetime.now() > expires_at:
+            raise ValueError("Authorization code expired")
+        # 使用済みIDはコードの有効期限まで保持すれば十分 (以降は期限切れで拒否される)
+        if not cls._redeemed_codes.set_if_absent(code_id, {}, expires_at):
+            raise ValueError("Authorization code already used")
+        return {**code_data, "expires_at": expires_at}
+
+    @classmethod
+    @_instrumented("refresh_access_token", grant_type="refresh_token")
+    def refresh_access_token(
+        cls, refresh_token: str, client_id: str, scope: str = None
+    ) -> dict:
+        token_data = cls._refresh_tokens.get(refresh_token)
+        if not token_data:
+            raise ValueError("Invalid refresh token")
+        if token_data["used"]:
+            # ローテーション済みのトークンが再利用された: ファミリー全体を失効させる
+            cls.revoke_family(token_data["family"])
+            raise ValueError("Refresh token reuse detected")
+        if token_data["client_id"] != client_id:
+            raise ValueError("Client ID mismatch")
+        if datetime.now() > token_data["expires_at"]:
+            raise ValueError("Refresh token expired")
+
+        # 元のスコープ以下への縮小のみ許可する
+        if scope and not set(scope.split()) <= set(token_data["scope"].split()):
+            raise ValueError("Requested scope exceeds original grant")
+
+        # 取り出しと同時に削除する。他のリクエストが先に使っていれば再利用とみなす
+        consumed = cls._refresh_tokens.pop(refresh_token)
+        if not consumed or consumed["used"]:
+            cls.revoke_family(token_data["family"])
+            raise ValueError("Refresh token reuse detected")
 
-        # 使用済みの認可コードを削除
-        del cls._auth_codes[code]
+        # 使用済みとして期限まで残し、再利用を検知できるようにする
+        cls._refresh_tokens.set(
+            refresh_token,
+            {**token_data, "used": True},
+            token_data["expires_at"],
+            group=token_data["family"],
+        )
+
+        token_response = cls._issue_access_token(
+            client_id=client_id,
+            user_id=token_data["user_id"],
+            scope=scope or token_data["scope"],
+            family=token_data["family"],
+        )
+        token_response["refresh_token"] = cls._issue_refresh_token(
+            client_id=client_id,
+            user_id=token_data["user_id"],
+            scope=token_data["scope"],
+            family=token_data["family"],
+        )
+        return token_response
+
+    @classmethod
+    # 再利用した場合は発行件数に数えないため、発行件数は本体で記録する
+    @_instrumented("client_credentials")
+    def issue_client_credentials_token(
+        cls, client_id: str, allowed_scopes: FrozenSet[str], scope: Optional[str] = None
+    ) -> dict:
+        """ユーザーに紐づかないクライアント自身のアクセストークンを発行する
+
+        スコープ省略時はクライアントに許可された全スコープとする。
+        リフレッシュトークンは発行しない (RFC 6749 4.4.3)。
+        """
+        # ユーザーのいないトークンのため、IDトークン用の openid は対象外
+        allowed_scopes = allowed_scopes - {"openid"}
+        scopes = set(scope.split()) if scope else set(allowed_scopes)
+        if not scopes or not scopes <= allowed_scopes:
+            raise ValueError("Requested scope is not allowed")
+        scope = " ".join(sorted(scopes))
+
+        # 同じスコープの要求には発行済みのトークンを返す。残り有効期間が
+        # 閾値を下回った時点で保存領域の期限切れとなり、新しく発行される
+        cache_key = f"{client_id} {scope}"
+        if settings.CLIENT_CREDENTIALS_REUSE:
+            cached = cls._reusable_client_token(cache_key)
+            if cached:
+                tokens_reused.inc()
+                return {
+                    "access_token": cached["access_token"],
+                    "token_type": "Bearer",
+                    "expires_in": int(
+                        (cached["expires_at"] - datetime.now()).total_seconds()
+                    ),
+                    "scope": scope,
+                }
+
+        token_response = cls._issue_access_token(
+            client_id=client_id, user_id=None, scope=scope
+        )
+        tokens_issued.inc("client_credentials")
+        expires_at = datetime.now() + timedelta(seconds=token_response["expires_in"])
+        reuse_until = expires_at - timedelta(
+            seconds=settings.CLIENT_CREDENTIALS_REUSE_MIN_SECONDS
+        )
+        if settings.CLIENT_CREDENTIALS_REUSE and reuse_until > datetime.now():
+            cls._client_tokens.set(
+                cache_key,
+                {
+                    "access_token": token_response["access_token"],
+                    "expires_at": expires_at,
+                    "reuse_until": reuse_until,
+                },
+                reuse_until,
+            )
+        return token_response
+
+    @classmethod
+    def _reusable_client_token(cls, cache_key: str) -> Optional[dict]:
+        cached = cls._client_tokens.get(cache_key)
+        if not cached or datetime.now() >= cached["reuse_until"]:
+            return None
+        token = cached["access_token"]
+        # 不透明トークンが追い出し等で保存領域から消えていれば再利用しない
+        if not is_jwt(token) and token not in cls._tokens:
+            return None
+        return cached
+
+    @classmethod
+    def revoke_family(cls, family: str) -> None:
+        """ファミリーに属するリフレッシュトークンとアクセストークンを失効させる"""
+        cls._refresh_tokens.pop_group(family)
+        cls._tokens.pop_group(family)
+
+    @classmethod
+    def _issue_refresh_token(
+        cls, client_id: str, user_id: int, scope: str, family: str
+    ) -> str:
+        refresh_token = secrets.token_urlsafe(32)
+        expires_at = datetime.now() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        cls._refresh_tokens.set(
+            refresh_token,
+            {
+                "client_id": client_id,
+                "user_id": user_id,
+                "scope": scope,
+                "family": family,
+                "used": False,
+                "expires_at": expires_at,
+            },
+            expires_at,
+            group=family,
+        )
+        return refresh_token
+
+    @classmethod
+    def _issue_access_token(
+        cls, client_id: str, user_id: Optional[int], scope: str, family: str = None
+    ) -> dict:
+        # 有効期間はトークンの形式によらず ACCESS_TOKEN_EXPIRE_MINUTES とする
+        lifetime = access_token_lifetime()
+        expires_at = datetime.now() + lifetime
+        if settings.ACCESS_TOKEN_FORMAT == "jwt":
+            # 自己完結型トークンは保存しない
+            token = encode_access_token(
+                client_id=client_id,
+                user_id=user_id,
+                scope=scope,
+                expires_at=expires_at,
+            )
+        else:
+            # アクセストークン生成
+            token = secrets.token_urlsafe(32)
+
+            # トークンデータの保存
+            cls._tokens.set(
+                token,
+                {
+                    "client_id": client_id,
+                    "user_id": user_id,
+                    "scope": scope,
+                    "expires_at": expires_at,
+                },
+                expires_at,
+                group=family,
+            )
 
         return {
             "access_token": token,
             "token_type": "Bearer",
-            "expires_in": 3600,
-            "scope": code_data["scope"],
+            "expires_in": int(lifetime.total_seconds()),
+            "scope": scope,
         }
 
     @classmethod
+    @_instrumented("validate_token")
     def validate_token(cls, token: str, required_scope: str = None) -> dict:
-        token_data = cls._tokens.get(token)
-        if not token_data:
-            raise ValueError("Invalid token")
-        if datetime.now() > token_data["expires_at"]:
-            raise ValueError("Token expired")
+        if is_jwt(token):
+            # 署名と有効期限のみで検証し、保存領域は参照しない
+            claims = decode_access_token(token)
+            if cls._revoked_jtis.is_revoked(claims["jti"]):
+                raise ValueError("Token revoked")
+            token_data = {
+                "client_id": claims["client_id"],
+                "user_id": (
+                    None
+                    if claims.get("gty") == "client_credentials"
+                    else int(claims["sub"])
+                ),
+                "scope": claims["scope"],
+                "exp": claims["exp"],
+            }
+        else:
+            token_data = cls._tokens.get(token)
+            if not token_data:
+                raise ValueError("Invalid token")
+            if datetime.now() > token_data["expires_at"]:
+                raise ValueError("Token expired")
+            token_data = {
+                **token_data,
+                "exp": int(token_data["expires_at"].timestamp()),
+            }
 
         # スコープの検証
         if required_scope:
@@ -78,4 +392,105 @@ class OAuthService:
             "client_id": token_data["client_id"],
             "user_id": token_data["user_id"],
             "scope": token_data["scope"],
+            "exp": token_data["exp"],
         }
+
+    @classmethod
+    def introspect(cls, token: str) -> dict:
+        """RFC 7662 形式のイントロスペクション結果を返す"""
+        try:
+            token_data = cls.validate_token(token)
+        except ValueError:
+            return {"active": False}
+        return {
+            "active": True,
+            "scope": token_data["scope"],
+            "client_id": token_data["client_id"],
+            "exp": token_data["exp"],
+            "token_type": "Bearer",
+        }
+
+    @classmethod
+    def revoke_token(cls, token: str, client_id: str) -> None:
+        """RFC 7009: クライアント自身に発行されたトークンを失効させる
+
+        不正なトークンや他クライアントのトークンは何もせずに無視する。
+        """
+        refresh_data = cls._refresh_tokens.get(token)
+        if refresh_data:
+            if refresh_data["client_id"] == client_id:
+                # リフレッシュトークンの失効は同じファミリーのトークンにも及ぶ
+                cls.revoke_family(refresh_data["family"])
+            return
+
+        if is_jwt(token):
+            try:
+                claims = decode_access_token(token)
+            except ValueError:
+                return
+            if claims["client_id"] == client_id:
+                cls._revoked_jtis.revoke(
+                    claims["jti"], datetime.fromtimestamp(claims["exp"])
+                )
+                cls._forget_client_token(client_id, claims["scope"], token)
+            return
+
+        token_data = cls._tokens.get(token)
+        if token_data and token_data["client_id"] == client_id:
+            cls._tokens.delete(token)
+            cls._forget_client_token(client_id, token_data["scope"], token)
+
+    @classmethod
+    def _forget_client_token(cls, client_id: str, scope: str, token: str) -> None:
+        # 失効させたトークンを再利用キャッシュから返さないようにする
+        cache_key = f"{client_id} {scope}"
+        cached = cls._client_tokens.get(cache_key)
+        if cached and cached["access_token"] == token:
+            cls._client_tokens.delete(cache_key)
+
+    @classmethod
+    def stores(cls) -> list:
+        return [
+            cls._auth_codes,
+            cls._redeemed_codes,
+            cls._tokens,
+            cls._refresh_tokens,
+            cls._client_tokens,
+            cls._revoked_jtis,
+        ]
+
+    @classmethod
+    def store_stats(cls) -> dict:
+        """保存領域ごとの件数カウンタ (live / expired_swept / evicted)"""
+        return {store.name: store.stats() for store in cls.stores()}
+
+
+def _store_metric(key: str):
+    return lambda: {
+        (name,): stats[key] for name, stats in OAuthService.store_stats().items()
+    }
+
+
+registry.register(
+    CallbackMetric(
+        "token_store_entries", "Live entries", _store_metric("live"), ("store",)
+    )
+)
+registry.register(
+    CallbackMetric(
+        "token_store_expired_swept_total",
+        "Expired entries removed by the sweeper",
+        _store_metric("expired_swept"),
+        ("store",),
+        type="counter",
+    )
+)
+registry.register(
+    CallbackMetric(
+        "token_store_evicted_total",
+        "Entries evicted because the store was full",
+        _store_metric("evicted"),
+        ("store",),
+        type="counter",
+    )
+)
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import (
+    CallbackMetric,
+    password_hash_wait,
+    password_verify_duration,
+    registry,
+)
+from app.core.security import (
+    get_password_hash,
+    verify_and_update_password,
+    verify_password,
+)
+
+
+class PasswordHasherBusy(Exception):
+    """ハッシュ処理の待ち行列が上限に達した"""
+
+
+class PasswordHasher:
+    """パスワードハッシュ処理をイベントループ外のスレッドプールで実行する
+
+    bcrypt / argon2 は処理中に GIL を解放するため、スレッドで並列に実行できる。
+    実行中と待機中の合計が max_workers + max_queue を超えると
+    PasswordHasherBusy を送出し、待ち行列が際限なく伸びるのを防ぐ。
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.started = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        result, elapsed = await self._submit(
+            verify_password, plain_password, hashed_password
+        )
+        password_verify_duration.observe(elapsed)
+        return result
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """検証と同時に、ハッシュ方式/コストの変更に伴う再ハッシュを行う"""
+        result, elapsed = await self._submit(
+            verify_and_update_password, plain_password, hashed_password
+        )
+        password_verify_duration.observe(elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        result, _ = await self._submit(get_password_hash, password)
+        return result
+
+    def hash_many(self, passwords: Iterable[str]) -> List[str]:
+        """同期処理 (スクリプト) 向けにプールで並列にハッシュ化する"""
+        return list(self._executor.map(get_password_hash, passwords))
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "started": self.started,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "wait_seconds_avg": (
+                self.wait_seconds_total / self.started if self.started else 0.0
+            ),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, waited, elapsed = await loop.run_in_executor(
+                self._executor, self._run, time.perf_counter(), func, args
+            )
+            # メトリクスはイベントループ側で記録する
+            password_hash_wait.observe(waited)
+            return result, elapsed
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _run(self, submitted_at: float, func, args):
+        # プールの空き待ち時間を記録する
+        waited = time.perf_counter() - submitted_at
+        with self._lock:
+            self.started += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        began = time.perf_counter()
+        result = func(*args)
+        return result, waited, time.perf_counter() - began
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+registry.register(
+    CallbackMetric(
+        "password_hash_pool_in_flight",
+        "Hashing jobs running or queued",
+        lambda: {(): password_hasher.stats()["in_flight"]},
+    )
+)
+registry.register(
+    CallbackMetric(
+        "password_hash_pool_rejected_total",
+        "Hashing jobs rejected because the queue was full",
+        lambda: {(): password_hasher.rejected},
+        type="counter",
+    )
+)
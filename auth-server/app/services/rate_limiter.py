@@ -0,0 +1,202 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from fastapi import Request
+from app.core.config import settings
+from app.core.metrics import CallbackMetric, registry
+
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter", ["rule"]
+)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, rule: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded: {rule}")
+        self.rule = rule
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class MemoryRateLimitBackend:
+    """プロセス内メモリのトークンバケット
+
+    バケットは (残りトークン数, 更新時刻, 満タンになる時刻) を保持する。
+    満タンのバケットは存在しないのと同じなので、掃除で削除し、
+    上限件数を超えた場合は最も古く使われたバケットから追い出す。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        """トークンを1つ消費する。成功なら0、失敗なら再試行までの秒数を返す"""
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                retry_after = (1 - tokens) / rate
+            else:
+                tokens -= 1
+                retry_after = 0.0
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        with self._lock:
+            full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+            for key in full:
+                del self._buckets[key]
+        return len(full)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteRateLimitBackend:
+    """複数のuvicornワーカー (プロセス) で共有するSQLite (WAL) のトークンバケット
+
+    読み取りと更新を BEGIN IMMEDIATE のトランザクションで行うため、
+    ワーカー間で同時に消費してもトークン数は正しく数えられる。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limit (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                full_at REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッド間で共有しない
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limit WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            if tokens < 1:
+                retry_after = (1 - tokens) / rate
+            else:
+                tokens -= 1
+                retry_after = 0.0
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit (key, tokens, updated, full_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) / rate),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        return (
+            self._connection()
+            .execute("DELETE FROM rate_limit WHERE full_at <= ?", (now or time.time(),))
+            .rowcount
+        )
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM rate_limit")
+
+
+class RateLimiter:
+    """ルールごとのトークンバケットによるレート制限
+
+    ルールは 名前 -> (バケット容量, 容量分が回復するまでの秒数)。
+    DB検索やbcryptの前に呼び出し、超過時は RateLimitExceeded を送出する。
+    """
+
+    def __init__(self, backend, rules: Dict[str, Tuple[int, float]], enabled: bool = True):
+        self.backend = backend
+        self.rules = rules
+        self.enabled = enabled
+
+    def check(self, **keys: Optional[str]) -> None:
+        """ルール名=キー の組で指定した全てのバケットからトークンを消費する"""
+        if not self.enabled:
+            return
+        now = time.time()
+        for rule, value in keys.items():
+            if value is None:
+                continue
+            capacity, period = self.rules[rule]
+            retry_after = self.backend.take(
+                f"{rule}:{value}", capacity, capacity / period, now
+            )
+            if retry_after:
+                rate_limit_rejections.inc(rule)
+                raise RateLimitExceeded(rule, retry_after)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        return self.backend.sweep(now)
+
+
+def client_ip(request: Request) -> str:
+    """レート制限のキーにするクライアントのアドレス
+
+    ASGIサーバーによっては request.client が None になるため、その場合は
+    固定のキーにまとめる (制限を素通りさせない)。
+    """
+    return request.client.host if request.client else "unknown"
+
+
+def create_rate_limiter() -> RateLimiter:
+    """設定 (RATE_LIMIT_BACKEND) に応じたレート制限を生成する"""
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        backend = SQLiteRateLimitBackend(settings.TOKEN_STORE_SQLITE_PATH)
+    elif settings.RATE_LIMIT_BACKEND == "memory":
+        backend = MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_ENTRIES)
+    else:
+        raise ValueError(f"Unsupported rate limit backend: {settings.RATE_LIMIT_BACKEND}")
+    return RateLimiter(backend, settings.RATE_LIMITS, settings.RATE_LIMIT_ENABLED)
+
+
+rate_limiter = create_rate_limiter()
+
+registry.register(
+    CallbackMetric(
+        "rate_limit_buckets",
+        "Rate limit buckets that have not refilled yet",
+        lambda: {(): len(rate_limiter.backend)},
+    )
+)
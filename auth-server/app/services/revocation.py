@@ -0,0 +1,86 @@
+import hashlib
+import math
+from datetime import datetime
+from typing import Iterable, Optional
+from app.core.config import settings
+from app.services.token_store import TokenStore
+
+
+class BloomFilter:
+    """失効済みIDの有無を判定するブルームフィルタ
+
+    偽陽性はあるが偽陰性はない。「失効していない」の判定は
+    ビット配列の参照のみで完了する。
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # 1回のハッシュ計算から double hashing で k 個の位置を求める
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationList:
+    """自己完結型トークン (JWT) の失効済み jti の集合
+
+    失効済みIDは保存領域に元のトークンの期限まで保持し、その前段に
+    ブルームフィルタを置く。大半を占める「失効していない」トークンは
+    フィルタだけで判定し、保存領域は参照しない。
+    フィルタは削除ができないため、掃除のたびに保存領域から作り直す。
+    共有保存領域を使う場合、他ワーカーでの失効は次の掃除で反映される。
+    """
+
+    def __init__(self, store: TokenStore):
+        self.store = store
+        self.name = store.name
+        self._filter = self._build_filter(store.keys())
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def revoke(self, jti: str, expires_at: datetime) -> None:
+        self.store.set(jti, {"expires_at": expires_at}, expires_at)
+        self._filter.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._filter:
+            return False
+        return self.store.get(jti) is not None
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        removed = self.store.sweep(now)
+        self._filter = self._build_filter(self.store.keys())
+        return removed
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+    @staticmethod
+    def _build_filter(keys: list) -> BloomFilter:
+        bloom = BloomFilter(
+            max(settings.REVOCATION_FILTER_CAPACITY, 2 * len(keys)),
+            settings.REVOCATION_FILTER_ERROR_RATE,
+        )
+        for key in keys:
+            bloom.add(key)
+        return bloom
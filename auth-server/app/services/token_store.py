@@ -0,0 +1,452 @@
+import asyncio
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class TokenStore(ABC):
+    """有効期限付きのトークン/認可コード保存領域のインターフェース
+
+    各エントリは期限 (expires_at) と任意のグループを持つ。pop は
+    取り出しと削除を不可分に行うため、認可コードなどの単一使用の検証に使う。
+    max_entries が None の場合は追い出しを行わず、件数は有効期限のみで抑える。
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int]):
+        self.name = name
+        self.max_entries = max_entries
+        self.expired_swept = 0
+        self.evicted = 0
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def set(
+        self,
+        key: str,
+        value: dict,
+        expires_at: datetime,
+        group: Optional[str] = None,
+    ) -> None: ...
+
+    @abstractmethod
+    def set_if_absent(self, key: str, value: dict, expires_at: datetime) -> bool:
+        """キーが存在しない場合のみ保存し、保存したかどうかを返す"""
+
+    @abstractmethod
+    def pop(self, key: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def pop_group(self, group: str) -> List[dict]:
+        """グループに属するエントリをすべて削除して返す"""
+
+    @abstractmethod
+    def keys(self) -> List[str]: ...
+
+    def delete(self, key: str) -> None:
+        self.pop(key)
+
+    @abstractmethod
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """期限切れのエントリを削除し、削除件数を返す"""
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self),
+            "expired_swept": self.expired_swept,
+            "evicted": self.evicted,
+        }
+
+
+class MemoryTokenStore(TokenStore):
+    """プロセス内メモリの保存領域
+
+    有効期限をヒープで管理し、期限切れエントリを定期的に掃除する。
+    上限件数を超えた場合は最も早く期限切れになるエントリから追い出す。
+    group を指定したエントリはグループ単位でまとめて削除できる。
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int]):
+        super().__init__(name, max_entries)
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+        # グループ (トークンファミリー等) からキーへの索引
+        self._groups: Dict[str, Set[str]] = {}
+        self._group_of: Dict[str, str] = {}
+        # (期限のUNIX時刻, 挿入順, キー) のヒープ。削除済みキーの要素は遅延で捨てる
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def set(
+        self,
+        key: str,
+        value: dict,
+        expires_at: datetime,
+        group: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            self._set_locked(key, value, expires_at.timestamp(), group)
+
+    def set_if_absent(self, key: str, value: dict, expires_at: datetime) -> bool:
+        with self._lock:
+            # 掃除前の期限切れエントリは存在しないものとして扱う
+            entry = self._entries.get(key)
+            if entry and entry[0] > datetime.now().timestamp():
+                return False
+            self._set_locked(key, value, expires_at.timestamp(), None)
+            return True
+
+    def pop(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._remove_locked(key)
+        return entry[1] if entry else None
+
+    def pop_group(self, group: str) -> List[dict]:
+        with self._lock:
+            keys = self._groups.pop(group, set())
+            values = []
+            for key in keys:
+                self._group_of.pop(key, None)
+                entry = self._entries.pop(key, None)
+                if entry:
+                    values.append(entry[1])
+        return values
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        timestamp = (now or datetime.now()).timestamp()
+        with self._lock:
+            return self._sweep_locked(timestamp)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._group_of.clear()
+            self._heap.clear()
+
+    def _set_locked(
+        self, key: str, value: dict, deadline: float, group: Optional[str]
+    ) -> None:
+        if (
+            self.max_entries is not None
+            and key not in self._entries
+            and len(self._entries) >= self.max_entries
+        ):
+            self._sweep_locked(datetime.now().timestamp())
+            while len(self._entries) >= self.max_entries:
+                self._evict_one_locked()
+        self._remove_locked(key)
+        self._entries[key] = (deadline, value)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+            self._group_of[key] = group
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        self._compact_locked()
+
+    def _is_current(self, deadline: float, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] == deadline
+
+    def _remove_locked(self, key: str) -> Optional[Tuple[float, dict]]:
+        group = self._group_of.pop(key, None)
+        if group is not None:
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+        return self._entries.pop(key, None)
+
+    def _sweep_locked(self, timestamp: float) -> int:
+        removed = 0
+        while self._heap and self._heap[0][0] <= timestamp:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._is_current(deadline, key):
+                self._remove_locked(key)
+                removed += 1
+        self.expired_swept += removed
+        return removed
+
+    def _evict_one_locked(self) -> None:
+        # 追い出しポリシー: 残り有効期間が最も短いエントリから削除
+        while self._heap:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._is_current(deadline, key):
+                self._remove_locked(key)
+                self.evicted += 1
+                return
+
+    def _compact_locked(self) -> None:
+        # pop済みキーの要素がヒープに溜まり続けないように再構築する
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [
+                item for item in self._heap if self._is_current(item[0], item[2])
+            ]
+            heapq.heapify(self._heap)
+
+
+def _encode_value(value: dict) -> str:
+    return json.dumps(
+        value,
+        default=lambda o: {"__datetime__": o.isoformat()},
+        separators=(",", ":"),
+    )
+
+
+def _decode_value(data: str) -> dict:
+    def object_hook(obj: dict):
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        return obj
+
+    return json.loads(data, object_hook=object_hook)
+
+
+class SQLiteTokenStore(TokenStore):
+    """複数のuvicornワーカー (プロセス) で共有するSQLite (WAL) の保存領域
+
+    pop / pop_group は DELETE ... RETURNING で取り出しと削除を1文で行うため、
+    ワーカー間でも単一使用が保証される。件数はトリガーで token_store_size に
+    集計し、挿入のたびに上限件数を適用する。
+    呼び出しはブロックするため、非同期の処理からは run_store_io 経由で呼び出す。
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int], path: str):
+        super().__init__(name, max_entries)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(
+                """
+                BEGIN IMMEDIATE;
+                CREATE TABLE IF NOT EXISTS token_store (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    grp TEXT,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS ix_token_store_expires
+                    ON token_store (namespace, expires_at);
+                CREATE INDEX IF NOT EXISTS ix_token_store_group
+                    ON token_store (namespace, grp) WHERE grp IS NOT NULL;
+                CREATE TABLE IF NOT EXISTS token_store_size (
+                    namespace TEXT PRIMARY KEY,
+                    entries INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TRIGGER IF NOT EXISTS token_store_inserted
+                    AFTER INSERT ON token_store
+                BEGIN
+                    INSERT INTO token_store_size (namespace, entries)
+                        VALUES (NEW.namespace, 1)
+                        ON CONFLICT (namespace) DO UPDATE SET entries = entries + 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS token_store_deleted
+                    AFTER DELETE ON token_store
+                BEGIN
+                    UPDATE token_store_size SET entries = entries - 1
+                        WHERE namespace = OLD.namespace;
+                END;
+                """
+            )
+            # 集計を持たない既存のファイルは、トリガーの作成と同じトランザクションで数える
+            conn.execute(
+                "INSERT OR IGNORE INTO token_store_size (namespace, entries)"
+                " SELECT ?, COUNT(*) FROM token_store WHERE namespace = ?",
+                (name, name),
+            )
+            conn.execute("COMMIT")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッド間で共有しない
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT entries FROM token_store_size WHERE namespace = ?", (self.name,)
+            )
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def get(self, key: str) -> Optional[dict]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM token_store WHERE namespace = ? AND key = ?",
+                (self.name, key),
+            )
+            .fetchone()
+        )
+        return _decode_value(row[0]) if row else None
+
+    def set(
+        self,
+        key: str,
+        value: dict,
+        expires_at: datetime,
+        group: Optional[str] = None,
+    ) -> None:
+        conn = self._connection()
+        # INSERT OR REPLACE の削除は削除トリガーを起動しないため、UPSERT で更新する
+        conn.execute(
+            "INSERT INTO token_store (namespace, key, value, expires_at, grp)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value,"
+            " expires_at = excluded.expires_at, grp = excluded.grp",
+            (self.name, key, _encode_value(value), expires_at.timestamp(), group),
+        )
+        self._enforce_limit(conn)
+
+    def set_if_absent(self, key: str, value: dict, expires_at: datetime) -> bool:
+        conn = self._connection()
+        # 掃除前の期限切れエントリは置き換え、有効なエントリがあれば挿入しない
+        conn.execute(
+            "DELETE FROM token_store WHERE namespace = ? AND key = ? AND expires_at <= ?",
+            (self.name, key, datetime.now().timestamp()),
+        )
+        inserted = (
+            conn.execute(
+                "INSERT OR IGNORE INTO token_store (namespace, key, value, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (self.name, key, _encode_value(value), expires_at.timestamp()),
+            ).rowcount
+            == 1
+        )
+        if inserted:
+            self._enforce_limit(conn)
+        return inserted
+
+    def pop(self, key: str) -> Optional[dict]:
+        row = (
+            self._connection()
+            .execute(
+                "DELETE FROM token_store WHERE namespace = ? AND key = ? RETURNING value",
+                (self.name, key),
+            )
+            .fetchone()
+        )
+        return _decode_value(row[0]) if row else None
+
+    def pop_group(self, group: str) -> List[dict]:
+        rows = (
+            self._connection()
+            .execute(
+                "DELETE FROM token_store WHERE namespace = ? AND grp = ? RETURNING value",
+                (self.name, group),
+            )
+            .fetchall()
+        )
+        return [_decode_value(row[0]) for row in rows]
+
+    def keys(self) -> List[str]:
+        rows = (
+            self._connection()
+            .execute("SELECT key FROM token_store WHERE namespace = ?", (self.name,))
+            .fetchall()
+        )
+        return [row[0] for row in rows]
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        conn = self._connection()
+        timestamp = (now or datetime.now()).timestamp()
+        removed = conn.execute(
+            "DELETE FROM token_store WHERE namespace = ? AND expires_at <= ?",
+            (self.name, timestamp),
+        ).rowcount
+        self.expired_swept += removed
+        return removed
+
+    def clear(self) -> None:
+        self._connection().execute(
+            "DELETE FROM token_store WHERE namespace = ?", (self.name,)
+        )
+
+    def _enforce_limit(self, conn: sqlite3.Connection) -> None:
+        if self.max_entries is None or len(self) <= self.max_entries:
+            return
+        self.sweep()
+        # 追い出しポリシー: 残り有効期間が最も短いエントリから削除
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self.evicted += conn.execute(
+                "DELETE FROM token_store WHERE namespace = ? AND key IN ("
+                " SELECT key FROM token_store WHERE namespace = ?"
+                " ORDER BY expires_at LIMIT ?)",
+                (self.name, self.name, excess),
+            ).rowcount
+
+
+def create_token_store(name: str, capped: bool = True) -> TokenStore:
+    """設定 (TOKEN_STORE_BACKEND) に応じた保存領域を生成する
+
+    capped=False の場合は上限件数を設けない。追い出しで記録が消えると
+    安全性が損なわれる保存領域 (使用済みコードの記録など) に使う。
+    """
+    max_entries = settings.TOKEN_STORE_MAX_ENTRIES if capped else None
+    if settings.TOKEN_STORE_BACKEND == "sqlite":
+        return SQLiteTokenStore(name, max_entries, settings.TOKEN_STORE_SQLITE_PATH)
+    if settings.TOKEN_STORE_BACKEND == "memory":
+        return MemoryTokenStore(name, max_entries)
+    raise ValueError(f"Unsupported token store backend: {settings.TOKEN_STORE_BACKEND}")
+
+
+async def run_store_io(func: Callable[..., T], *args, **kwargs) -> T:
+    """保存領域を使う同期処理を呼び出す
+
+    sqlite バックエンドはファイルI/Oでブロックするため、スレッドプールで実行して
+    イベントループを止めない。memory の場合はスレッド切り替えを避けて直接呼び出す。
+    """
+    if settings.TOKEN_STORE_BACKEND == "sqlite":
+        return await run_in_threadpool(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+async def run_sweeper(stores: List[TokenStore], interval: float) -> None:
+    """バックグラウンドで定期的に期限切れエントリを掃除する"""
+    while True:
+        await asyncio.sleep(interval)
+        for store in stores:
+            # 掃除は件数に比例して時間がかかるため、イベントループの外で実行する
+            await run_in_threadpool(store.sweep)
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple, Union
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.user import User
+
+
+class CachedUser(NamedTuple):
+    """キャッシュするユーザー行のスナップショット (セッションに紐づかない)"""
+
+    id: int
+    sub: str
+    username: str
+    password: str
+    email: Optional[str]
+    email_verified: bool
+    updated_at: datetime
+
+    @classmethod
+    def from_row(cls, user: User) -> "CachedUser":
+        return cls(*(getattr(user, field) for field in cls._fields))
+
+
+# 「存在しない」ことを記録した否定エントリ
+_NOT_FOUND = None
+# キャッシュにエントリがない
+MISS = object()
+
+CacheKey = Tuple[str, Union[str, int]]
+
+
+class UserLookupCache:
+    """ユーザー名/ID からユーザー行を引くための、TTL付きのLRUキャッシュ
+
+    存在しないユーザー名も否定エントリとして短いTTLで保持し、
+    存在しないユーザー名での総当たりがDB検索にならないようにする。
+    書き込み時は invalidate で明示的に削除する。
+
+    キャッシュはワーカー (プロセス) ごとにあり、invalidate は書き込んだワーカーの
+    キャッシュにしか効かない。他のワーカーは TTL の間 (否定エントリは
+    negative_ttl の間) 古い行を返しうる。行にはパスワードハッシュも含まれるため、
+    パスワード変更後も他のワーカーでは最大 TTL の間、変更前のパスワードで
+    ログインできる。TTL はこの食い違いが許容できる長さに設定すること。
+    """
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Optional[CachedUser]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey):
+        """キャッシュ済みのユーザー、否定エントリなら None、なければ MISS を返す"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: CachedUser) -> None:
+        deadline = time.monotonic() + self.ttl
+        with self._lock:
+            self._set_locked(("username", user.username), deadline, user)
+            self._set_locked(("id", user.id), deadline, user)
+
+    def put_missing(self, key: CacheKey) -> None:
+        with self._lock:
+            self._set_locked(key, time.monotonic() + self.negative_ttl, _NOT_FOUND)
+
+    def invalidate(self, user_id: Optional[int] = None, username: Optional[str] = None):
+        with self._lock:
+            for key in (("id", user_id), ("username", username)):
+                entry = self._entries.pop(key, None)
+                # 片方のキーから引いたユーザーのもう片方のキーも削除する
+                if entry and entry[1] is not None:
+                    self._entries.pop(("id", entry[1].id), None)
+                    self._entries.pop(("username", entry[1].username), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _set_locked(self, key: CacheKey, deadline: float, user) -> None:
+        self._entries[key] = (deadline, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+user_cache = UserLookupCache(
+    settings.USER_CACHE_MAX_ENTRIES,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    negative_ttl=settings.USER_CACHE_NEGATIVE_TTL_SECONDS,
+)
+
+
+async def get_user_by_username(
+    db: AsyncSession, username: str, trust_missing: bool = True
+) -> Optional[CachedUser]:
+    """trust_missing=False の場合、否定エントリは使わずにDBを検索する"""
+    cached = user_cache.get(("username", username))
+    if cached is not MISS and (cached is not None or trust_missing):
+        return cached
+    result = await db.execute(select(User).where(User.username == username))
+    return _remember(result.scalars().first(), ("username", username))
+
+
+async def get_user_by_id(
+    db: AsyncSession, user_id: int, updated_at: Optional[datetime] = None
+) -> Optional[CachedUser]:
+    """updated_at を指定した場合、それと一致しないキャッシュは使わない"""
+    cached = user_cache.get(("id", user_id))
+    if cached is not MISS and (
+        updated_at is None or (cached is not None and cached.updated_at == updated_at)
+    ):
+        return cached
+    result = await db.execute(select(User).where(User.id == user_id))
+    return _remember(result.scalars().first(), ("id", user_id))
+
+
+def _remember(user: Optional[User], key: CacheKey) -> Optional[CachedUser]:
+    if user is None:
+        user_cache.put_missing(key)
+        return None
+    cached = CachedUser.from_row(user)
+    user_cache.put(cached)
+    return cached
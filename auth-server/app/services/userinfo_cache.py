@@ -0,0 +1,110 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+from app.core.config import settings
+from app.models.user import User
+
+CacheKey = Tuple[int, FrozenSet[str]]
+
+
+class UserinfoEntry:
+    def __init__(self, updated_at: datetime, body: bytes, etag: str):
+        self.updated_at = updated_at
+        self.body = body  # シリアライズ済みのレスポンス
+        self.etag = etag
+
+
+def build_userinfo_claims(user: User, scopes: FrozenSet[str]) -> dict:
+    # OpenID Connect (許可されたスコープのクレームのみ)
+    claims = {"sub": user.sub}
+
+    # profileスコープがある場合
+    if "profile" in scopes:
+        claims.update(
+            {
+                "name": user.username,
+                "preferred_username": user.username,
+                "updated_at": int(user.updated_at.timestamp()),
+            }
+        )
+
+    # emailスコープがある場合
+    if "email" in scopes and user.email:
+        claims.update({"email": user.email, "email_verified": user.email_verified})
+
+    return claims
+
+
+def userinfo_etag(sub: str, updated_at: datetime, scopes: FrozenSet[str]) -> str:
+    source = f"{sub}:{updated_at.isoformat()}:{' '.join(sorted(scopes))}"
+    return '"' + hashlib.sha256(source.encode()).hexdigest()[:32] + '"'
+
+
+class UserinfoCache:
+    """(user_id, スコープ集合) ごとのuserinfoレスポンスのLRUキャッシュ
+
+    エントリは作成時の updated_at を保持し、ユーザーの updated_at が
+    変わっていれば無効とみなす。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, UserinfoEntry]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, user_id: int, scopes: FrozenSet[str], updated_at: datetime
+    ) -> Optional[UserinfoEntry]:
+        key = (user_id, scopes)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.updated_at != updated_at:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def build(self, user: User, scopes: FrozenSet[str]) -> UserinfoEntry:
+        """ユーザー行からレスポンスを組み立ててキャッシュに保存する"""
+        body = json.dumps(
+            build_userinfo_claims(user, scopes),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+        entry = UserinfoEntry(
+            user.updated_at, body, userinfo_etag(user.sub, user.updated_at, scopes)
+        )
+        key = (user.id, scopes)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._discard_index(evicted)
+        return entry
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+    def _discard_index(self, key: CacheKey) -> None:
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+
+userinfo_cache = UserinfoCache(settings.USERINFO_CACHE_MAX_ENTRIES)
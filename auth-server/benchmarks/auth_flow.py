@@ -0,0 +1,172 @@
+"""認可コードフロー全体の負荷ベンチマーク
+
+login → authorize → 同意 (POST) → token → userinfo を app.main:app に対して
+httpx の ASGI トランスポートでプロセス内から実行し、ステップごとの
+リクエスト/秒と p50/p95/p99 レイテンシを JSON Lines で出力する。
+一時的なSQLiteにテストユーザーを投入するため、ネットワークは不要。
+同意画面を毎回通るように、フローごとに同意のない別のユーザーでログインする。
+
+    poetry run python -m benchmarks.auth_flow --concurrency 8 --iterations 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+from benchmarks.common import PASSWORD, percentile, seed_users
+
+REDIRECT_URI = "http://localhost:8001/auth/callback"
+STEPS = ("login", "authorize", "consent", "token", "userinfo")
+
+
+async def run_user(app, index: int, iterations: int, scope: str, timings, errors):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="https://testserver"
+    ) as client:
+        for iteration in range(iterations):
+            try:
+                await run_flow(client, index * iterations + iteration, scope, timings)
+            except AssertionError as e:
+                errors[str(e)] += 1
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+            client.cookies.clear()
+
+
+async def timed(timings, step, request):
+    began = time.perf_counter()
+    response = await request
+    timings[step].append(time.perf_counter() - began)
+    return response
+
+
+async def run_flow(client, index: int, scope: str, timings) -> None:
+    response = await timed(
+        timings,
+        "login",
+        client.post("/login", data={"username": f"bench{index}", "password": PASSWORD}),
+    )
+    assert response.status_code == 303, "login"
+
+    params = {
+        "response_type": "code",
+        "client_id": "client123",
+        "redirect_uri": REDIRECT_URI,
+        "scope": scope,
+        "state": "benchmark",
+    }
+    response = await timed(
+        timings, "authorize", client.get("/oauth/authorize", params=params)
+    )
+    if response.status_code == 200:
+        # 同意画面 (同意済みなら省略される)
+        csrf_token = re.search(r'name="csrf_token" value="([^"]+)"', response.text)
+        response = await timed(
+            timings,
+            "consent",
+            client.post(
+                "/oauth/authorize",
+                data={"csrf_token": csrf_token.group(1), "action": "allow"},
+            ),
+        )
+    assert response.status_code == 303, "authorize"
+    code = re.search(r"code=([^&]+)", response.headers["location"]).group(1)
+
+    response = await timed(
+        timings,
+        "token",
+        client.post(
+            "/oauth/token",
+            data={
+                "client_id": "client123",
+                "client_secret": "client-secret",
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": REDIRECT_URI,
+            },
+        ),
+    )
+    assert response.status_code == 200, "token"
+    access_token = response.json()["access_token"]
+
+    response = await timed(
+        timings,
+        "userinfo",
+        client.get(
+            "/oauth/userinfo", headers={"Authorization": f"Bearer {access_token}"}
+        ),
+    )
+    assert response.status_code == 200, "userinfo"
+
+
+async def main(args) -> None:
+    from app.main import app
+
+    await seed_users(args.concurrency * args.iterations)
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    async with app.router.lifespan_context(app):
+        began = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_user(app, i, args.iterations, args.scope, timings, errors)
+                for i in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - began
+
+    for step in STEPS:
+        values = sorted(timings[step])
+        print(
+            json.dumps(
+                {
+                    "benchmark": "auth_flow",
+                    "step": step,
+                    "concurrency": args.concurrency,
+                    "requests": len(values),
+                    "requests_per_second": round(len(values) / elapsed, 1),
+                    "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                    "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                }
+            ),
+            flush=True,
+        )
+    flows = args.concurrency * args.iterations - sum(errors.values())
+    print(
+        json.dumps(
+            {
+                "benchmark": "auth_flow",
+                "step": "total",
+                "concurrency": args.concurrency,
+                "flows": flows,
+                "flows_per_second": round(flows / elapsed, 1),
+                "seconds": round(elapsed, 3),
+                "errors": dict(errors),
+            }
+        ),
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--scope", default="profile email")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 設定はインポート時に読まれるため、アプリの読み込み前に一時DBを指定する
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/benchmark.db"
+        os.environ.setdefault("TEMPLATE_BYTECODE_CACHE_DIR", f"{tmp}/jinja_cache")
+        # 全ユーザーが同一IPからログインするため、レート制限は無効にする
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        asyncio.run(main(args))
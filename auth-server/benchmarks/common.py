@@ -0,0 +1,40 @@
+"""ベンチマーク共通の集計とテストユーザー投入"""
+
+PASSWORD = "benchmark"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def seed_users(count: int, reset: bool = False) -> None:
+    """create_test_users と同様に bench0 から順にテストユーザーを投入する
+
+    reset=True の場合、既存のテーブルを削除してから作り直す
+    (--database-url で同じデータベースを繰り返し測定する場合など)。
+    """
+    from app.database import AsyncSessionLocal, Base, async_engine
+    from app.models import consent  # noqa: F401
+    from app.models.user import User
+    from app.services.password_service import password_hasher
+
+    async with async_engine.begin() as conn:
+        if reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    # 全ユーザー同じパスワードのため、ハッシュ化は1回で済ませる
+    hashed = await password_hasher.hash(PASSWORD)
+    async with AsyncSessionLocal() as db:
+        db.add_all(
+            User(
+                username=f"bench{i}",
+                password=hashed,
+                email=f"bench{i}@example.com",
+                email_verified=True,
+            )
+            for i in range(count)
+        )
+        await db.commit()
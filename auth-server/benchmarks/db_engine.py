@@ -0,0 +1,141 @@
+"""データベースエンジン設定ごとの /login (読み取り) と /register (書き込み) の同時実行性能
+
+設定ごとに子プロセスを起動し (設定はインポート時に読まれるため)、
+ログインと新規登録を同時に実行してリクエスト/秒と p50/p95/p99 を JSON Lines で出力する。
+bcrypt の負荷でデータベースの差が隠れないよう、ラウンド数は最小にする。
+
+    poetry run python -m benchmarks.db_engine --concurrency 16 --requests 50
+    poetry run python -m benchmarks.db_engine --database-url postgresql+asyncpg://...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from benchmarks.common import PASSWORD, percentile, seed_users
+
+# 比較する設定: 名前 -> 環境変数
+CONFIGURATIONS = {
+    # 変更前相当: ロールバックジャーナル、synchronous=FULL、mmapなし
+    "sqlite-rollback": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": "0",
+    },
+    "sqlite-wal": {},
+    "sqlite-wal-pool-1": {"DATABASE_POOL_SIZE": "1", "DATABASE_MAX_OVERFLOW": "0"},
+}
+
+
+async def run_client(app, index, requests, users, timings, errors):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="https://testserver"
+    ) as client:
+        for i in range(requests):
+            # ログイン3回につき新規登録1回の割合で混ぜる
+            if i % 4 == 3:
+                step = "register"
+                form = {"username": f"new-{uuid.uuid4().hex}", "password": PASSWORD}
+            else:
+                step = "login"
+                form = {"username": f"bench{(index + i) % users}", "password": PASSWORD}
+            began = time.perf_counter()
+            response = await client.post(f"/{step}", data=form)
+            timings[step].append(time.perf_counter() - began)
+            if response.status_code != 303:
+                errors[f"{step}:{response.status_code}"] += 1
+            client.cookies.clear()
+
+
+async def child(args) -> None:
+    from app.main import app
+
+    await seed_users(args.users, reset=True)
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    async with app.router.lifespan_context(app):
+        began = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_client(app, i, args.requests, args.users, timings, errors)
+                for i in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - began
+
+    for step in ("login", "register"):
+        values = sorted(timings[step])
+        print(
+            json.dumps(
+                {
+                    "benchmark": "db_engine",
+                    "configuration": args.name,
+                    "step": step,
+                    "concurrency": args.concurrency,
+                    "requests": len(values),
+                    "requests_per_second": round(len(values) / elapsed, 1),
+                    "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                    "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                    "errors": {k: v for k, v in errors.items() if k.startswith(step)},
+                }
+            ),
+            flush=True,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="クライアントごとの件数")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--database-url", help="指定した場合はこのURLのみを測定する")
+    parser.add_argument("--name", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.database_url:
+            configurations = {"custom": {"DATABASE_URL": args.database_url}}
+        else:
+            configurations = {
+                name: {"DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/{name}.db", **env}
+                for name, env in CONFIGURATIONS.items()
+            }
+        for name, env in configurations.items():
+            env = {
+                **os.environ,
+                "PASSWORD_SCHEME": "bcrypt",
+                "PASSWORD_BCRYPT_ROUNDS": "4",
+                "RATE_LIMIT_ENABLED": "false",
+                "TEMPLATE_BYTECODE_CACHE_DIR": f"{tmp}/jinja_cache",
+                **env,
+            }
+            subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.db_engine", "--child",
+                    "--name", name,
+                    "--concurrency", str(args.concurrency),
+                    "--requests", str(args.requests),
+                    "--users", str(args.users),
+                ],
+                env=env,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""署名付きCookieセッションとサーバー側セッションのリクエストあたりのレイテンシ比較
+
+OAuthルートと同程度のセッション内容 (user / oauth_state / csrf_token) を持たせ、
+読み取りのみのリクエストと書き込みを伴うリクエストをそれぞれ計測する。
+
+    poetry run python -m benchmarks.session_middleware --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.sessions import SessionMiddleware
+from app.core.session import MemorySessionBackend, ServerSessionMiddleware
+
+SESSION_CONTENT = {
+    "user": {"id": 1, "username": "test1"},
+    "oauth_state": {
+        "response_type": "code",
+        "client_id": "client123",
+        "redirect_uri": "http://localhost:8001/auth/callback",
+        "state": "x" * 43,
+        "scope": "profile email",
+    },
+    "csrf_token": "y" * 43,
+}
+
+
+def build_app(kind: str) -> FastAPI:
+    app = FastAPI()
+    if kind == "signed_cookie":
+        app.add_middleware(
+            SessionMiddleware, secret_key="benchmark", session_cookie="session"
+        )
+    else:
+        app.add_middleware(
+            ServerSessionMiddleware,
+            backend=MemorySessionBackend(max_entries=100_000, ttl=3600),
+            session_cookie="session",
+        )
+
+    @app.get("/init")
+    async def init(request: Request):
+        request.session.update(SESSION_CONTENT)
+        return {}
+
+    @app.get("/read")
+    async def read(request: Request):
+        return {"user": request.session.get("user")}
+
+    @app.get("/write")
+    async def write(request: Request):
+        request.session["csrf_token"] = str(time.perf_counter_ns())
+        return {}
+
+    return app
+
+
+async def measure(kind: str, path: str, requests: int) -> dict:
+    transport = httpx.ASGITransport(app=build_app(kind))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/init")
+        cookie_size = len(client.cookies.get("session", ""))
+        latencies = []
+        for _ in range(requests):
+            began = time.perf_counter()
+            await client.get(path)
+            latencies.append((time.perf_counter() - began) * 1_000_000)
+    latencies.sort()
+    return {
+        "benchmark": "session_middleware",
+        "middleware": kind,
+        "request": path.lstrip("/"),
+        "requests": requests,
+        "cookie_bytes": cookie_size,
+        "mean_us": round(statistics.fmean(latencies), 1),
+        "p50_us": round(latencies[len(latencies) // 2], 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)], 1),
+    }
+
+
+async def main(requests: int) -> None:
+    for path in ("/read", "/write"):
+        for kind in ("signed_cookie", "server_side"):
+            print(json.dumps(await measure(kind, path, requests)), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
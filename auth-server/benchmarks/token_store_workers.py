@@ -0,0 +1,111 @@
+"""複数ワーカー (プロセス) での認可コード発行・交換スループットの測定
+
+各ワーカーが発行した認可コードを隣のワーカーが交換するため、
+ワーカー間で保存領域を共有できているかも同時に確認できる。
+
+    poetry run python -m benchmarks.token_store_workers --workers 4 --codes 2000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+REDIRECT_URI = "http://localhost:8001/auth/callback"
+
+
+def _worker(index, codes, backend, path, outbox, inbox, results, start):
+    # 設定はインポート時に読まれるため、先に環境変数を設定する
+    os.environ["TOKEN_STORE_BACKEND"] = backend
+    os.environ["TOKEN_STORE_SQLITE_PATH"] = path
+    from app.services.oauth_service import OAuthService
+
+    start.wait()
+    began = time.perf_counter()
+    for _ in range(codes):
+        outbox.put(
+            OAuthService.generate_authorization_code(
+                client_id="client123",
+                user_id=index,
+                redirect_uri=REDIRECT_URI,
+                scope="profile",
+            )
+        )
+
+    exchanged = failed = 0
+    for _ in range(codes):
+        code = inbox.get()
+        try:
+            token = OAuthService.exchange_code_for_token(
+                code=code, client_id="client123", redirect_uri=REDIRECT_URI
+            )
+            OAuthService.validate_token(token["access_token"], "profile")
+            exchanged += 1
+        except ValueError:
+            failed += 1
+    results.put((exchanged, failed, time.perf_counter() - began))
+
+
+def run(workers: int, codes: int, backend: str, path: str) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(workers)]
+    results = ctx.Queue()
+    start = ctx.Event()
+    processes = [
+        ctx.Process(
+            target=_worker,
+            args=(
+                i,
+                codes,
+                backend,
+                path,
+                queues[(i + 1) % workers],
+                queues[i],
+                results,
+                start,
+            ),
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(1.0)  # 各ワーカーのインポート完了を待つ
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    exchanged = sum(o[0] for o in outcomes)
+    return {
+        "benchmark": "token_store_workers",
+        "backend": backend,
+        "workers": workers,
+        "codes_per_worker": codes,
+        "exchanged": exchanged,
+        "failed": sum(o[1] for o in outcomes),
+        "seconds": round(elapsed, 3),
+        # 発行 + 交換 + 検証を1フローとして数える
+        "flows_per_second": round(exchanged / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--codes", type=int, default=2000)
+    parser.add_argument("--backend", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backend:
+            for workers in args.workers:
+                path = os.path.join(tmp, f"{backend}-{workers}.db")
+                print(json.dumps(run(workers, args.codes, backend, path)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
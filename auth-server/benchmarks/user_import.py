@@ -0,0 +1,122 @@
+"""ユーザー一括インポートのスループット測定
+
+合成データ (CSV) を生成して一時SQLiteへ取り込み、件数/秒を JSON Lines で出力する。
+--baseline を指定すると、create_test_users と同じ1件ずつの存在確認と
+直列ハッシュ化による取り込みも同じデータで測定する。
+
+    poetry run python -m benchmarks.user_import --users 20000 --rounds 4 --baseline
+"""
+
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+
+def write_dataset(path: str, users: int, duplicates: float) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, ["username", "password", "email", "email_verified"])
+        writer.writeheader()
+        for i in range(users):
+            # 一定割合で既出のユーザーを混ぜ、重複の読み飛ばしも測定する
+            n = i // 2 if i and (i % 100) < duplicates * 100 else i
+            writer.writerow(
+                {
+                    "username": f"user{n}",
+                    "password": f"password{n}",
+                    "email": f"user{n}@example.com",
+                    "email_verified": "true",
+                }
+            )
+
+
+def run_baseline(path: str, url: str) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.core.security import get_password_hash
+    from app.models.user import User
+    from app.scripts.import_users import read_records
+
+    engine = create_engine(url)
+    began = time.perf_counter()
+    processed = inserted = 0
+    with Session(engine) as db:
+        for record in read_records(path):
+            processed += 1
+            if db.query(User).filter(User.username == record["username"]).first():
+                continue
+            db.add(
+                User(
+                    username=record["username"],
+                    password=get_password_hash(record["password"]),
+                    email=record["email"],
+                    email_verified=True,
+                )
+            )
+            db.flush()
+            inserted += 1
+        db.commit()
+    return {"processed": processed, "inserted": inserted, "seconds": time.perf_counter() - began}
+
+
+def run_bulk(path: str, url: str, workers: int, chunk_size: int) -> dict:
+    from sqlalchemy import create_engine
+    from app.scripts.import_users import import_users
+
+    with open(os.devnull, "w") as devnull:
+        return import_users(
+            path,
+            engine=create_engine(url),
+            chunk_size=chunk_size,
+            workers=workers,
+            progress=devnull,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--duplicates", type=float, default=0.05)
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt のラウンド数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--baseline", action="store_true")
+    args = parser.parse_args()
+
+    # 設定はインポート時に読まれるため、先に環境変数を設定する (ワーカープロセスにも継承)
+    os.environ["PASSWORD_SCHEME"] = "bcrypt"
+    os.environ["PASSWORD_BCRYPT_ROUNDS"] = str(args.rounds)
+    from sqlalchemy import create_engine
+    from app.database import Base
+    from app.models import consent, user  # noqa: F401 テーブル定義の登録
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "users.csv")
+        write_dataset(dataset, args.users, args.duplicates)
+
+        modes = [("bulk", lambda url: run_bulk(dataset, url, args.workers, args.chunk_size))]
+        if args.baseline:
+            modes.append(("baseline", lambda url: run_baseline(dataset, url)))
+        for mode, run in modes:
+            url = f"sqlite:///{tmp}/{mode}.db"
+            Base.metadata.create_all(create_engine(url))
+            result = run(url)
+            print(
+                json.dumps(
+                    {
+                        "benchmark": "user_import",
+                        "mode": mode,
+                        "users": args.users,
+                        "inserted": result["inserted"],
+                        "seconds": round(result["seconds"], 3),
+                        "records_per_second": round(args.users / result["seconds"], 1),
+                    }
+                ),
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import hashlib
+from app.services.client_registry import ClientRegistry
+
+CLIENTS = {
+    "client123": {
+        "name": "Client App",
+        "uri": "http://localhost:8001",
+        "client_secret": "client-secret",
+        "redirect_uris": ["http://localhost:8001/a", "http://localhost:8001/b"],
+        "allowed_scopes": ["profile"],
+    }
+}
+
+
+def test_compiles_policy_and_authenticates():
+    registry = ClientRegistry(CLIENTS)
+    client = registry.get("client123")
+
+    assert client.allows_redirect_uri("http://localhost:8001/b")
+    assert not client.allows_redirect_uri("http://localhost:8001/b/")
+    assert client.allowed_scopes == frozenset({"profile"})
+    assert registry.authenticate("client123", "client-secret") is client
+    assert registry.authenticate("client123", "wrong") is None
+    assert registry.authenticate("unknown", "client-secret") is None
+
+
+def test_reload_replaces_clients_and_notifies_listeners():
+    registry = ClientRegistry(CLIENTS)
+    reloaded = []
+    registry.on_reload(lambda: reloaded.append(True))
+    secret_hash = hashlib.sha256(b"other-secret").hexdigest()
+
+    registry.reload(
+        {
+            "other": {
+                "client_secret_hash": secret_hash,
+                "redirect_uri": "http://localhost:9000/callback",
+            }
+        }
+    )
+
+    assert registry.get("client123") is None
+    assert registry.authenticate("other", "other-secret")
+    assert reloaded == [True]
@@ -0,0 +1,59 @@
+import asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.database import Base
+from app.models.consent import Consent  # noqa: F401
+from app.models.user import User
+from app.services.consent_service import (
+    create_consent_table,
+    get_granted_scopes,
+    remember_consent,
+)
+
+
+def test_remembered_scopes_are_merged(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(engine)() as db:
+            db.add(User(id=1, username="test1", password="x"))
+            await db.commit()
+
+            assert await get_granted_scopes(db, 1, "client123") == frozenset()
+            await remember_consent(db, 1, "client123", {"profile"})
+            await remember_consent(db, 1, "client123", {"email"})
+            granted = await get_granted_scopes(db, 1, "client123")
+        await engine.dispose()
+        return granted
+
+    assert asyncio.run(run()) == frozenset({"profile", "email"})
+
+
+def test_concurrent_first_consent_is_merged(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(User.__table__.create)
+        # consents テーブルのない既存DBにも作成される
+        await create_consent_table(engine)
+        sessions = async_sessionmaker(engine)
+        async with sessions() as db, sessions() as other:
+            db.add(User(id=1, username="test1", password="x"))
+            await db.commit()
+
+            execute = db.execute
+
+            async def execute_racing(statement):
+                # 検索の直後に別のリクエストが同意を作成する
+                result = await execute(statement)
+                db.execute = execute
+                await remember_consent(other, 1, "client123", {"profile"})
+                return result
+
+            db.execute = execute_racing
+            await remember_consent(db, 1, "client123", {"email"})
+            granted = await get_granted_scopes(db, 1, "client123")
+        await engine.dispose()
+        return granted
+
+    assert asyncio.run(run()) == frozenset({"profile", "email"})
@@ -0,0 +1,29 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.cors import ClientOriginsCORSMiddleware
+from app.services.client_registry import ClientRegistry
+
+
+def _client(uri: str) -> dict:
+    return {"client_secret": "secret", "uri": uri}
+
+
+def test_allowed_origins_follow_client_reload():
+    registry = ClientRegistry({"a": _client("http://a.example.com")})
+    app = FastAPI()
+    app.add_middleware(
+        ClientOriginsCORSMiddleware, registry=registry, allow_credentials=True
+    )
+    app.get("/")(lambda: {})
+    client = TestClient(app)
+
+    def allowed_origin(origin: str):
+        response = client.get("/", headers={"Origin": origin})
+        return response.headers.get("Access-Control-Allow-Origin")
+
+    assert allowed_origin("http://a.example.com") == "http://a.example.com"
+    assert allowed_origin("http://b.example.com") is None
+
+    registry.reload({"b": _client("http://b.example.com")})
+    assert allowed_origin("http://a.example.com") is None
+    assert allowed_origin("http://b.example.com") == "http://b.example.com"
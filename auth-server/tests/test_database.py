@@ -0,0 +1,86 @@
+import asyncio
+from sqlalchemy import func, make_url, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app import database
+from app.core.config import settings
+from app.database import (
+    Base,
+    _engine_options,
+    create_database_engines,
+    get_async_db,
+    sync_database_url,
+)
+from app.models.user import User
+
+
+def test_sync_url_replaces_async_driver():
+    url = sync_database_url("sqlite+aiosqlite:///./auth.db")
+    assert str(url) == "sqlite:///./auth.db"
+    assert (
+        sync_database_url("postgresql+asyncpg://u:p@db/auth").drivername
+        == "postgresql+psycopg2"
+    )
+    assert sync_database_url("mysql+pymysql://db/auth").drivername == "mysql+pymysql"
+
+
+def test_pool_options_follow_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_POOL_SIZE", 3)
+    sqlite_options = _engine_options(make_url("sqlite:///./auth.db"))
+    postgres_options = _engine_options(make_url("postgresql+asyncpg://db/auth"))
+
+    assert sqlite_options["pool_size"] == postgres_options["pool_size"] == 3
+    assert sqlite_options["connect_args"] == {"check_same_thread": False}
+    assert "connect_args" not in postgres_options
+    # インメモリDBにはプールの設定を適用しない
+    assert _engine_options(make_url("sqlite://")) == {}
+
+
+def test_sqlite_pragmas_are_applied_to_both_engines(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT_MS", 1234)
+    async_engine, sync_engine = create_database_engines(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
+    )
+    pragmas = ("journal_mode", "synchronous", "busy_timeout")
+    with sync_engine.connect() as conn:
+        values = [conn.exec_driver_sql(f"PRAGMA {p}").scalar() for p in pragmas]
+    # synchronous=NORMAL は 1
+    assert values == ["wal", 1, 1234]
+
+    async def run():
+        async with async_engine.connect() as conn:
+            result = await conn.exec_driver_sql("PRAGMA busy_timeout")
+            busy_timeout = result.scalar()
+        await async_engine.dispose()
+        return busy_timeout
+
+    assert asyncio.run(run()) == 1234
+
+
+def test_get_async_db_yields_session_on_async_engine(tmp_path, monkeypatch):
+    async_engine, sync_engine = create_database_engines(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
+    )
+    Base.metadata.create_all(sync_engine)
+    options = {k: v for k, v in database.AsyncSessionLocal.kw.items() if k != "bind"}
+    monkeypatch.setattr(
+        database, "AsyncSessionLocal", async_sessionmaker(async_engine, **options)
+    )
+
+    async def run():
+        sessions = get_async_db()
+        db = await anext(sessions)
+        assert isinstance(db, AsyncSession)
+        user = User(username="alice", password="x")
+        db.add(user)
+        await db.commit()
+        # expire_on_commit=False のため、コミット後も再読み込みせずに参照できる
+        assert user.id is not None and user.sub
+        result = await db.execute(select(User.username))
+        assert result.scalars().all() == ["alice"]
+        await sessions.aclose()
+        await async_engine.dispose()
+
+    asyncio.run(run())
+    # スクリプト用の同期エンジンは同じデータベースを参照する
+    with sync_engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(User)).scalar() == 1
@@ -0,0 +1,34 @@
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.keys import id_token_key_set
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_discovery_document_is_cached_with_strong_etag():
+    response = client.get("/.well-known/openid-configuration")
+    assert response.status_code == 200
+    document = response.json()
+    assert document["issuer"] == settings.ISSUER
+    assert document["token_endpoint"] == f"{settings.ISSUER}/oauth/token"
+    assert set(document["scopes_supported"]) == settings.AVAILABLE_SCOPES
+
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+    assert "max-age" in response.headers["Cache-Control"]
+    cached = client.get(
+        "/.well-known/openid-configuration", headers={"If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+
+
+def test_id_tokens_are_verifiable_with_the_published_jwks():
+    document = client.get("/.well-known/openid-configuration").json()
+    assert "RS256" in document["id_token_signing_alg_values_supported"]
+    assert document["jwks_uri"] == f"{settings.ISSUER}/.well-known/jwks.json"
+
+    # HS256 のアクセストークンでも、IDトークン用の公開鍵は公開する
+    jwks = client.get("/.well-known/jwks.json").json()
+    assert id_token_key_set.current.kid in {key["kid"] for key in jwks["keys"]}
+    assert all("d" not in key for key in jwks["keys"])
@@ -0,0 +1,63 @@
+import json
+from sqlalchemy import create_engine, func, select
+from app.core.security import verify_password
+from app.database import Base
+from app.models.user import User
+from app.scripts.import_users import import_users
+
+PRE_HASHED = "$2b$04$WsStx6v3qmFoTGSmCW7BJeoPwG.Q63qZqUDDx9lMpsBbirh.sy9qW"
+
+
+def test_import_is_idempotent_and_resumable(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/users.db")
+    Base.metadata.create_all(engine)
+    source = tmp_path / "users.ndjson"
+    source.write_text(
+        "\n".join(
+            json.dumps(record)
+            for record in [
+                {"username": "a", "password_hash": PRE_HASHED},
+                {"username": "b", "password_hash": PRE_HASHED, "email_verified": True},
+                {"username": "c", "password": "secret", "email": "c@example.com"},
+            ]
+        )
+    )
+
+    result = import_users(str(source), engine=engine, chunk_size=2, workers=1)
+    assert (result["processed"], result["inserted"]) == (3, 3)
+    with engine.connect() as conn:
+        hashed = conn.execute(select(User.password).where(User.username == "c")).scalar()
+    assert verify_password("secret", hashed)
+
+    # チェックポイントから再開すると処理済みのレコードは読み飛ばす
+    resumed = import_users(str(source), engine=engine, workers=1, resume=True)
+    assert resumed == {**resumed, "processed": 0, "resumed_from": 3}
+
+    # 最初から取り込み直しても重複は挿入されない
+    again = import_users(str(source), engine=engine, workers=1)
+    assert (again["inserted"], again["skipped"]) == (0, 3)
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(User)).scalar() == 3
+
+
+def test_import_mixes_records_with_and_without_sub(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/users.db")
+    Base.metadata.create_all(engine)
+    source = tmp_path / "users.ndjson"
+    source.write_text(
+        "\n".join(
+            json.dumps(record)
+            for record in [
+                {"username": "a", "password_hash": PRE_HASHED, "sub": "sub-a"},
+                {"username": "b", "password_hash": PRE_HASHED},
+                {"username": "c", "password_hash": PRE_HASHED, "sub": ""},
+            ]
+        )
+    )
+
+    result = import_users(str(source), engine=engine, workers=1)
+    assert result["inserted"] == 3
+    with engine.connect() as conn:
+        subs = dict(conn.execute(select(User.username, User.sub)).all())
+    assert subs["a"] == "sub-a"
+    assert subs["b"] and subs["c"] and subs["b"] != subs["c"]
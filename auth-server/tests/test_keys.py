@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import json
+import pytest
+from authlib.jose import JsonWebToken
+from app.core.keys import KeySet
+
+
+def _kids(key_set: KeySet) -> set:
+    return {k["kid"] for k in json.loads(key_set.jwks_bytes())["keys"]}
+
+
+def test_rotation_keeps_old_key_during_overlap():
+    key_set = KeySet("ES256", timedelta(hours=1), overlap=timedelta(minutes=30))
+    old = key_set.current
+    etag = key_set.jwks_etag()
+    now = datetime.now()
+
+    assert key_set.rotate_if_due(now + timedelta(hours=1))
+    assert key_set.current is not old
+    assert key_set.get(old.kid) is old
+    assert old.kid in _kids(key_set)
+    assert key_set.jwks_etag() != etag
+
+    key_set.rotate_if_due(now + timedelta(hours=1, minutes=31))
+    assert old.kid not in _kids(key_set)
+    with pytest.raises(ValueError):
+        key_set.get(old.kid)
+
+
+def test_token_signed_with_current_key_verifies_by_kid():
+    key_set = KeySet("ES256", timedelta(hours=1), overlap=timedelta(hours=1))
+    jwt = JsonWebToken(["ES256"])
+    signing_key = key_set.current
+    token = jwt.encode(
+        {"alg": "ES256", "kid": signing_key.kid}, {"sub": "1"}, signing_key.key
+    )
+
+    key_set.rotate()
+    claims = jwt.decode(token, lambda header, _: key_set.get(header["kid"]).key)
+    assert claims["sub"] == "1"
+
+
+def test_key_loaded_from_file_is_not_rotated():
+    initial = KeySet("ES256", timedelta(hours=1), overlap=timedelta(hours=1)).current
+    pem = initial.key.as_pem(is_private=True)
+    # 同じ鍵ファイルを読み込んだワーカー同士で JWKS が一致する
+    worker1 = KeySet("ES256", None, overlap=timedelta(hours=1), initial_key=pem)
+    worker2 = KeySet("ES256", None, overlap=timedelta(hours=1), initial_key=pem)
+
+    assert not worker1.rotate_if_due(datetime.now() + timedelta(days=365))
+    assert _kids(worker1) == _kids(worker2) == {initial.kid}
+    with pytest.raises(ValueError):
+        worker1.rotate()
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+from app.core.metrics import Registry, token_rejections
+from app.main import app
+from app.services.oauth_service import OAuthService
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{route="/a"} 2' in text
+
+
+def test_concurrent_updates_from_threads_are_not_lost():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ("kind",))
+    histogram = registry.histogram("latency_seconds", "Latency")
+
+    def record(i):
+        counter.inc(str(i % 4))
+        histogram.observe(0.01)
+        # 更新と並行して収集しても失敗しない
+        registry.render()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(record, range(2000)))
+
+    assert sum(counter.value(str(k)) for k in range(4)) == 2000
+    assert histogram.count() == 2000
+
+
+def test_rejections_are_counted_by_reason():
+    before = token_rejections.value("validate_token", "Invalid token")
+    with pytest.raises(ValueError):
+        OAuthService.validate_token("unknown-token")
+
+    assert token_rejections.value("validate_token", "Invalid token") == before + 1
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert "token_store_entries" in response.text
@@ -0,0 +1,233 @@
+from datetime import datetime
+import re
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.database import Base, get_async_db
+from app.main import app
+from app.models.user import User
+from app.services.oauth_service import OAuthService
+from app.services.user_cache import user_cache
+
+REDIRECT_URI = "http://localhost:8001/auth/callback"
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """テスト用DBの同期エンジン (テストからの直接の書き込み用)"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def browser(monkeypatch, db_engine):
+    """テスト用のDBを使い、登録したユーザーでログインしたクライアント"""
+    engine = create_async_engine(
+        db_engine.url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool
+    )
+
+    async def get_test_db():
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            yield db
+
+    monkeypatch.setitem(app.dependency_overrides, get_async_db, get_test_db)
+    # 別のテストのDBで同じIDを持つユーザーをキャッシュから返さない
+    user_cache.clear()
+    client = TestClient(app, base_url="https://testserver")
+    client.post("/register", data={"username": "alice", "password": "password"})
+    yield client
+    user_cache.clear()
+
+
+def _access_token(scope: str = "profile email") -> str:
+    # 登録したユーザー (id=1) の認可コードを発行して交換する
+    code = OAuthService.generate_authorization_code(
+        client_id="client123", user_id=1, redirect_uri=REDIRECT_URI, scope=scope
+    )
+    tokens = OAuthService.exchange_code_for_token(code, "client123", REDIRECT_URI)
+    return tokens["access_token"]
+
+
+def _authorize(client: TestClient, scope: str = "profile"):
+    return client.get(
+        "/oauth/authorize",
+        params={
+            "response_type": "code",
+            "client_id": "client123",
+            "redirect_uri": REDIRECT_URI,
+            "scope": scope,
+            "state": "xyz",
+        },
+        follow_redirects=False,
+    )
+
+
+def test_authorize_skips_consent_once_granted(browser):
+    # 初回は同意画面を表示する
+    response = _authorize(browser)
+    assert response.status_code == 200
+    csrf_token = re.search(r'name="csrf_token" value="([^"]+)"', response.text)[1]
+    response = browser.post(
+        "/oauth/authorize",
+        data={"csrf_token": csrf_token, "action": "allow"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+
+    # 許可済みのスコープでは同意画面を省略して直接コードを返す
+    response = _authorize(browser)
+    assert response.status_code == 303
+    location = urlsplit(response.headers["location"])
+    assert f"{location.scheme}://{location.netloc}{location.path}" == REDIRECT_URI
+    params = parse_qs(location.query)
+    assert params["state"] == ["xyz"] and params["code"]
+
+    # 許可していないスコープが含まれれば再び同意画面を表示する
+    assert _authorize(browser, "profile email").status_code == 200
+
+
+def test_userinfo_etag_and_conditional_request(browser, db_engine):
+    headers = {"Authorization": f"Bearer {_access_token()}"}
+    response = browser.get("/oauth/userinfo", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["preferred_username"] == "alice"
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = browser.get(
+        "/oauth/userinfo", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # ユーザー情報が更新されれば新しい内容とETagを返す
+    with db_engine.begin() as conn:
+        conn.execute(
+            update(User)
+            .where(User.id == 1)
+            .values(email="alice@example.com", updated_at=datetime(2030, 1, 1))
+        )
+    response = browser.get(
+        "/oauth/userinfo", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["email"] == "alice@example.com"
+    assert response.headers["ETag"] != etag
+
+
+def test_introspect_reports_active_and_inactive_tokens():
+    client = TestClient(app)
+    credentials = {"client_id": "client123", "client_secret": "client-secret"}
+    token = _access_token()
+
+    response = client.post("/oauth/introspect", data={**credentials, "token": token})
+    assert response.status_code == 200
+    assert response.json()["active"] is True
+    assert response.json()["client_id"] == "client123"
+    response = client.post("/oauth/introspect", data={**credentials, "token": "x"})
+    assert response.json() == {"active": False}
+
+    response = client.post(
+        "/oauth/introspect/bulk", json={**credentials, "tokens": [token, "x"]}
+    )
+    assert [r["active"] for r in response.json()["results"]] == [True, False]
+
+
+def test_introspect_requires_client_authentication():
+    client = TestClient(app)
+    credentials = {"client_id": "client123", "client_secret": "wrong"}
+
+    response = client.post("/oauth/introspect", data={**credentials, "token": "x"})
+    assert response.status_code == 401
+    response = client.post("/oauth/introspect/bulk", json={**credentials, "tokens": []})
+    assert response.status_code == 401
+
+
+def test_bulk_introspection_rejects_too_many_tokens():
+    credentials = {"client_id": "client123", "client_secret": "client-secret"}
+    tokens = ["x"] * (settings.INTROSPECTION_BULK_MAX_TOKENS + 1)
+
+    response = TestClient(app).post(
+        "/oauth/introspect/bulk", json={**credentials, "tokens": tokens}
+    )
+    assert response.status_code == 422
+
+
+def _token_request(**form):
+    credentials = {"client_id": "client123", "client_secret": "client-secret"}
+    return TestClient(app).post("/oauth/token", data={**credentials, **form})
+
+
+def test_refresh_grant_rotates_and_detects_reuse(monkeypatch):
+    # ファミリーの失効で無効になるのは保存領域で管理する不透明トークン
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "opaque")
+    code = OAuthService.generate_authorization_code(
+        client_id="client123", user_id=1, redirect_uri=REDIRECT_URI, scope="profile"
+    )
+    issued = _token_request(
+        grant_type="authorization_code", code=code, redirect_uri=REDIRECT_URI
+    ).json()
+
+    response = _token_request(
+        grant_type="refresh_token", refresh_token=issued["refresh_token"]
+    )
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != issued["refresh_token"]
+    assert rotated["access_token"] != issued["access_token"]
+
+    # ローテーション済みのトークンの再利用はファミリー全体を失効させる
+    response = _token_request(
+        grant_type="refresh_token", refresh_token=issued["refresh_token"]
+    )
+    assert response.status_code == 400
+    assert response.json() == {
+        "error": "invalid_grant",
+        "error_description": "Refresh token reuse detected",
+    }
+    response = _token_request(
+        grant_type="refresh_token", refresh_token=rotated["refresh_token"]
+    )
+    assert response.json()["error"] == "invalid_grant"
+    with pytest.raises(ValueError):
+        OAuthService.validate_token(rotated["access_token"])
+
+
+def test_unsupported_grant_type_gets_oauth_error():
+    response = _token_request(grant_type="password")
+    assert response.status_code == 400
+    assert response.json() == {
+        "error": "unsupported_grant_type",
+        "error_description": "Unsupported grant type",
+    }
+
+    response = _token_request(grant_type="refresh_token")
+    assert response.json()["error"] == "invalid_request"
+    response = TestClient(app).post(
+        "/oauth/token",
+        data={"client_id": "client123", "client_secret": "x", "grant_type": "password"},
+    )
+    assert response.status_code == 401
+    assert response.json()["error"] == "invalid_client"
+
+
+def test_client_credentials_grant_reuses_cached_token():
+    first = _token_request(grant_type="client_credentials", scope="profile")
+    assert first.status_code == 200
+    assert "refresh_token" not in first.json()
+
+    # 再利用の期間内は同じトークンを返す
+    again = _token_request(grant_type="client_credentials", scope="profile").json()
+    assert again["access_token"] == first.json()["access_token"]
+    assert again["expires_in"] <= first.json()["expires_in"]
+
+    response = _token_request(grant_type="client_credentials", scope="admin")
+    assert response.status_code == 400
+    assert response.json()["error"] == "invalid_scope"
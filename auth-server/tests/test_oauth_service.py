@@ -0,0 +1,282 @@
+from datetime import datetime
+import pytest
+from app.core.config import settings
+from app.core.metrics import tokens_issued, tokens_reused
+from app.core.keys import id_token_key_set, key_set
+from app.core.tokens import id_token_jwt, jwt
+from app.services.oauth_service import OAuthService
+from app.services.user_cache import CachedUser
+
+
+def _issue_token(scope: str = "profile email") -> dict:
+    code = OAuthService.generate_authorization_code(
+        client_id="client123",
+        user_id=1,
+        redirect_uri="http://localhost:8001/auth/callback",
+        scope=scope,
+    )
+    return OAuthService.exchange_code_for_token(
+        code=code,
+        client_id="client123",
+        redirect_uri="http://localhost:8001/auth/callback",
+    )
+
+
+def test_opaque_token_roundtrip():
+    token = _issue_token()
+
+    token_data = OAuthService.validate_token(token["access_token"], "profile")
+    assert token_data["user_id"] == 1
+    assert token_data["client_id"] == "client123"
+
+
+@pytest.mark.parametrize("token_format", ["opaque", "jwt"])
+def test_access_token_lifetime_follows_settings(monkeypatch, token_format):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", token_format)
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_EXPIRE_MINUTES", 5)
+    token = _issue_token()
+
+    assert token["expires_in"] == 300
+    exp = OAuthService.validate_token(token["access_token"])["exp"]
+    assert 298 <= exp - datetime.now().timestamp() <= 300
+
+
+def test_jwt_token_is_validated_without_store(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "jwt")
+    tokens_before = len(OAuthService._tokens)
+
+    token = _issue_token(scope="profile")
+
+    assert len(OAuthService._tokens) == tokens_before
+    token_data = OAuthService.validate_token(token["access_token"], "profile")
+    assert token_data["client_id"] == "client123"
+    assert token_data["user_id"] == 1
+    assert token_data["scope"] == "profile"
+    with pytest.raises(ValueError, match="required scope"):
+        OAuthService.validate_token(token["access_token"], "email")
+
+
+def test_jwt_token_with_bad_signature_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "jwt")
+    token = _issue_token()["access_token"]
+    header, payload, signature = token.split(".")
+
+    with pytest.raises(ValueError, match="Invalid token"):
+        OAuthService.validate_token(f"{header}.{payload}.{signature[::-1]}")
+
+
+def test_introspect_reports_active_and_inactive_tokens():
+    token = _issue_token(scope="profile")["access_token"]
+
+    result = OAuthService.introspect(token)
+    assert result["active"] is True
+    assert result["scope"] == "profile"
+    assert result["client_id"] == "client123"
+    assert result["exp"] > 0
+    assert OAuthService.introspect("unknown-token") == {"active": False}
+
+
+def test_refresh_token_rotation_and_reuse_detection():
+    first = _issue_token()
+
+    second = OAuthService.refresh_access_token(first["refresh_token"], "client123")
+    assert second["refresh_token"] != first["refresh_token"]
+    assert OAuthService.validate_token(second["access_token"])["user_id"] == 1
+
+    # ローテーション済みのトークンを再利用するとファミリー全体が失効する
+    with pytest.raises(ValueError, match="reuse detected"):
+        OAuthService.refresh_access_token(first["refresh_token"], "client123")
+    with pytest.raises(ValueError, match="Invalid token"):
+        OAuthService.validate_token(second["access_token"])
+    with pytest.raises(ValueError, match="Invalid refresh token"):
+        OAuthService.refresh_access_token(second["refresh_token"], "client123")
+
+
+def test_refresh_token_cannot_widen_scope():
+    token = _issue_token(scope="profile")
+
+    with pytest.raises(ValueError, match="exceeds original grant"):
+        OAuthService.refresh_access_token(
+            token["refresh_token"], "client123", scope="profile email"
+        )
+    refreshed = OAuthService.refresh_access_token(token["refresh_token"], "client123")
+    assert refreshed["scope"] == "profile"
+
+
+def test_revoked_jwt_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "jwt")
+    token = _issue_token()["access_token"]
+
+    OAuthService.revoke_token(token, "other-client")
+    assert OAuthService.validate_token(token)["user_id"] == 1
+
+    OAuthService.revoke_token(token, "client123")
+    with pytest.raises(ValueError, match="Token revoked"):
+        OAuthService.validate_token(token)
+
+
+def test_revoked_jwt_is_not_evicted_by_store_cap(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "jwt")
+    # TOKEN_STORE_MAX_ENTRIES=3 相当: 上限のある保存領域をすべて3件にする
+    for store in OAuthService.stores():
+        store = getattr(store, "store", store)
+        if store.max_entries is not None:
+            monkeypatch.setattr(store, "max_entries", 3)
+    first = _issue_token()["access_token"]
+    OAuthService.revoke_token(first, "client123")
+
+    for _ in range(5):
+        OAuthService.revoke_token(_issue_token()["access_token"], "client123")
+
+    with pytest.raises(ValueError, match="Token revoked"):
+        OAuthService.validate_token(first)
+
+
+def test_revoking_refresh_token_revokes_family():
+    token = _issue_token()
+
+    OAuthService.revoke_token(token["refresh_token"], "client123")
+
+    with pytest.raises(ValueError, match="Invalid token"):
+        OAuthService.validate_token(token["access_token"])
+    with pytest.raises(ValueError, match="Invalid refresh token"):
+        OAuthService.refresh_access_token(token["refresh_token"], "client123")
+
+
+def test_client_credentials_token_is_reused_until_revoked():
+    allowed = frozenset({"profile", "email"})
+    first = OAuthService.issue_client_credentials_token("client123", allowed)
+    assert first["scope"] == "email profile"
+    assert "refresh_token" not in first
+    assert OAuthService.validate_token(first["access_token"])["user_id"] is None
+
+    again = OAuthService.issue_client_credentials_token(
+        "client123", allowed, scope="profile email"
+    )
+    assert again["access_token"] == first["access_token"]
+    other = OAuthService.issue_client_credentials_token(
+        "client123", allowed, scope="profile"
+    )
+    assert other["access_token"] != first["access_token"]
+
+    OAuthService.revoke_token(first["access_token"], "client123")
+    fresh = OAuthService.issue_client_credentials_token("client123", allowed)
+    assert fresh["access_token"] != first["access_token"]
+    with pytest.raises(ValueError, match="not allowed"):
+        OAuthService.issue_client_credentials_token(
+            "client123", allowed, scope="openid"
+        )
+
+
+def test_client_credentials_jwt_has_no_user(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "jwt")
+    monkeypatch.setattr(settings, "CLIENT_CREDENTIALS_REUSE", False)
+    token = OAuthService.issue_client_credentials_token(
+        "client123", frozenset({"profile"})
+    )["access_token"]
+
+    token_data = OAuthService.validate_token(token, "profile")
+    assert token_data["user_id"] is None
+    assert token_data["client_id"] == "client123"
+
+
+def test_sealed_authorization_code_is_single_use(monkeypatch):
+    monkeypatch.setattr(settings, "AUTHORIZATION_CODE_FORMAT", "sealed")
+    codes_before = len(OAuthService._auth_codes)
+    code = OAuthService.generate_authorization_code(
+        client_id="client123",
+        user_id=1,
+        redirect_uri="http://localhost:8001/auth/callback",
+        scope="profile",
+    )
+    assert len(OAuthService._auth_codes) == codes_before
+
+    def exchange(code):
+        return OAuthService.exchange_code_for_token(
+            code=code,
+            client_id="client123",
+            redirect_uri="http://localhost:8001/auth/callback",
+        )
+
+    tampered = code[:-2] + ("AA" if code[-2:] != "AA" else "BB")
+    with pytest.raises(ValueError, match="Invalid authorization code"):
+        exchange(tampered)
+    token = exchange(code)
+    assert OAuthService.validate_token(token["access_token"])["scope"] == "profile"
+    with pytest.raises(ValueError, match="already used"):
+        exchange(code)
+
+
+def test_id_token_carries_nonce_and_scoped_claims():
+    code = OAuthService.generate_authorization_code(
+        client_id="client123",
+        user_id=1,
+        redirect_uri="http://localhost:8001/auth/callback",
+        scope="openid profile",
+        nonce="n-0S6_WzA2Mj",
+    )
+    code_data = OAuthService.redeem_authorization_code(
+        code, "client123", "http://localhost:8001/auth/callback"
+    )
+    user = CachedUser(
+        id=1,
+        sub="sub-1",
+        username="test1",
+        password="x",
+        email="test1@example.com",
+        email_verified=True,
+        updated_at=datetime(2025, 1, 1),
+    )
+    token = OAuthService.issue_code_tokens(code_data, id_token_user=user)
+
+    # IDトークンは RS256 で署名され、JWKS の鍵で検証できる
+    claims = id_token_jwt.decode(
+        token["id_token"], lambda header, _: id_token_key_set.get(header["kid"]).key
+    )
+    assert claims["aud"] == "client123"
+    assert claims["iss"] == settings.ISSUER
+    assert claims["sub"] == "sub-1"
+    assert claims["nonce"] == "n-0S6_WzA2Mj"
+    assert claims["preferred_username"] == "test1"
+    assert "email" not in claims
+
+
+def test_id_token_is_not_accepted_as_access_token(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "jwt")
+    # アクセストークンと同じ鍵で署名された IDトークン (ALGORITHM=RS256 の場合に相当)
+    header = {"alg": settings.ALGORITHM, "typ": "JWT"}
+    signing_key = settings.SECRET_KEY
+    if key_set:
+        header["kid"] = key_set.current.kid
+        signing_key = key_set.current.key
+    id_token = jwt.encode(
+        header,
+        {
+            "iss": settings.ISSUER,
+            "aud": "client123",
+            "sub": "sub-1",
+            "exp": int(datetime.now().timestamp()) + 60,
+        },
+        signing_key,
+    ).decode()
+
+    with pytest.raises(ValueError, match="Invalid token"):
+        OAuthService.validate_token(id_token)
+
+
+def test_evicted_client_credentials_token_is_not_reused():
+    allowed = frozenset({"profile"})
+    issued = tokens_issued.value("client_credentials")
+    reused = tokens_reused.value()
+    first = OAuthService.issue_client_credentials_token("client456", allowed)
+    again = OAuthService.issue_client_credentials_token("client456", allowed)
+    assert again["access_token"] == first["access_token"]
+    assert tokens_issued.value("client_credentials") == issued + 1
+    assert tokens_reused.value() == reused + 1
+
+    # 保存領域の上限で追い出された不透明トークンは再利用しない
+    OAuthService._tokens.delete(first["access_token"])
+    fresh = OAuthService.issue_client_credentials_token("client456", allowed)
+    assert fresh["access_token"] != first["access_token"]
+    assert OAuthService.validate_token(fresh["access_token"])["client_id"] == "client456"
+    assert tokens_issued.value("client_credentials") == issued + 2
@@ -0,0 +1,52 @@
+import asyncio
+from app.core.security import build_password_context
+from app.services.password_service import PasswordHasher, PasswordHasherBusy
+
+
+def test_hash_and_verify_off_event_loop():
+    hasher = PasswordHasher(max_workers=2, max_queue=2)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify("secret", hashed), await hasher.verify("x", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    assert hasher.stats()["started"] == 3
+    hasher.shutdown()
+
+
+def test_rejects_when_queue_is_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+
+    async def run():
+        return await asyncio.gather(
+            hasher.hash("a"), hasher.hash("b"), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert isinstance(results[1], PasswordHasherBusy)
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
+
+
+def test_policy_change_triggers_rehash():
+    old = build_password_context(
+        "bcrypt",
+        bcrypt_rounds=4,
+        argon2_time_cost=1,
+        argon2_memory_cost=1024,
+        argon2_parallelism=1,
+    )
+    new = build_password_context(
+        "bcrypt",
+        bcrypt_rounds=5,
+        argon2_time_cost=1,
+        argon2_memory_cost=1024,
+        argon2_parallelism=1,
+    )
+    hashed = old.hash("secret")
+
+    assert old.verify_and_update("secret", hashed) == (True, None)
+    verified, new_hash = new.verify_and_update("secret", hashed)
+    assert verified and new_hash.startswith("$2b$05$")
+    assert new.verify_and_update("wrong", hashed) == (False, None)
@@ -0,0 +1,93 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.database import Base, get_async_db
+from app.main import app
+from app.services.rate_limiter import (
+    MemoryRateLimitBackend,
+    RateLimiter,
+    RateLimitExceeded,
+    SQLiteRateLimitBackend,
+    rate_limiter,
+)
+
+
+def test_bucket_refills_over_time():
+    backend = MemoryRateLimitBackend(max_entries=10)
+
+    assert backend.take("k", capacity=2, rate=1.0, now=100.0) == 0
+    assert backend.take("k", capacity=2, rate=1.0, now=100.0) == 0
+    assert backend.take("k", capacity=2, rate=1.0, now=100.0) == pytest.approx(1.0)
+    assert backend.take("k", capacity=2, rate=1.0, now=101.0) == 0
+    # 満タンに戻ったバケットは掃除で削除される
+    assert backend.sweep(now=101.5) == 0
+    assert backend.sweep(now=103.0) == 1
+    assert len(backend) == 0
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    path = str(tmp_path / "limits.db")
+    worker1 = SQLiteRateLimitBackend(path)
+    worker2 = SQLiteRateLimitBackend(path)
+
+    assert worker1.take("k", capacity=1, rate=0.5, now=100.0) == 0
+    assert worker2.take("k", capacity=1, rate=0.5, now=100.0) == pytest.approx(2.0)
+
+
+def test_limiter_raises_with_rule_and_retry_after():
+    limiter = RateLimiter(MemoryRateLimitBackend(10), {"login_username": (1, 60.0)})
+    limiter.check(login_username="alice")
+
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.check(login_username="alice")
+    assert exc_info.value.rule == "login_username"
+    assert exc_info.value.retry_after_header == "60"
+    limiter.check(login_username="bob")
+
+
+def test_failed_logins_are_throttled_per_username(monkeypatch, tmp_path):
+    # auth.db を使わないように、テスト用のDBに差し替える
+    path = tmp_path / "test.db"
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+
+    async def get_test_db():
+        async with async_sessionmaker(engine)() as db:
+            yield db
+
+    monkeypatch.setitem(app.dependency_overrides, get_async_db, get_test_db)
+    monkeypatch.setitem(rate_limiter.rules, "login_username", (1, 60.0))
+    rate_limiter.backend.clear()
+    form = {"username": "alice", "password": "correct"}
+    TestClient(app, base_url="https://testserver").post("/register", data=form)
+    client = TestClient(app, base_url="https://testserver")
+
+    wrong = {"username": "alice", "password": "wrong"}
+    assert client.post("/login", data=wrong).status_code == 400
+    response = client.post("/login", data=wrong)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    # 失敗で使い切られても、正しいパスワードでのログインは妨げない
+    response = client.post("/login", data=form, follow_redirects=False)
+    assert response.status_code == 303
+    rate_limiter.backend.clear()
+
+
+def test_bad_client_secrets_do_not_block_the_real_client(monkeypatch):
+    monkeypatch.setitem(rate_limiter.rules, "token_client", (1, 60.0))
+    rate_limiter.backend.clear()
+    client = TestClient(app)
+    form = {"client_id": "client123", "grant_type": "client_credentials"}
+    wrong = {**form, "client_secret": "wrong"}
+
+    assert client.post("/oauth/token", data=wrong).status_code == 401
+    assert client.post("/oauth/token", data=wrong).status_code == 429
+    # 失敗で使い切られても、正しく認証したクライアントは制限しない
+    response = client.post(
+        "/oauth/token", data={**form, "client_secret": "client-secret"}
+    )
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "Bearer"
+    rate_limiter.backend.clear()
@@ -0,0 +1,87 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.core.session import MemorySessionBackend, ServerSessionMiddleware
+
+
+def _client(backend) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(
+        ServerSessionMiddleware, backend=backend, session_cookie="sid", max_age=60
+    )
+
+    @app.get("/set")
+    async def set_value(request: Request):
+        request.session["user"] = {"id": 1}
+        return {}
+
+    @app.get("/set-other")
+    async def set_other(request: Request):
+        request.session["next"] = "/"
+        return {}
+
+    @app.get("/get")
+    async def get_value(request: Request):
+        return {"user": request.session.get("user")}
+
+    @app.get("/clear")
+    async def clear(request: Request):
+        request.session.pop("user", None)
+        return {}
+
+    return TestClient(app)
+
+
+def test_cookie_carries_only_session_id_and_writes_on_change():
+    backend = MemorySessionBackend(max_entries=10, ttl=60)
+    client = _client(backend)
+
+    response = client.get("/set")
+    session_id = response.cookies["sid"]
+    assert "user" not in session_id
+    assert backend.load(session_id)[0] == {"user": {"id": 1}}
+
+    response = client.get("/get")
+    assert response.json() == {"user": {"id": 1}}
+    assert "set-cookie" not in response.headers
+
+    client.get("/clear")
+    assert backend.load(session_id) is None
+
+
+def test_lru_evicts_oldest_session():
+    backend = MemorySessionBackend(max_entries=1, ttl=60)
+    backend.save("a", {"v": 1})
+    backend.save("b", {"v": 2})
+
+    assert backend.load("a") is None
+    assert backend.load("b")[0] == {"v": 2}
+
+
+def test_session_id_is_rotated_when_user_changes():
+    backend = MemorySessionBackend(max_entries=10, ttl=60)
+    client = _client(backend)
+
+    anonymous_id = client.get("/set-other").cookies["sid"]
+    logged_in_id = client.get("/set").cookies["sid"]
+
+    assert logged_in_id != anonymous_id
+    assert backend.load(anonymous_id) is None
+    assert backend.load(logged_in_id)[0] == {"next": "/", "user": {"id": 1}}
+    # ユーザーが変わらない書き込みではIDを維持する
+    assert client.get("/set-other").cookies["sid"] == logged_in_id
+
+
+def test_reads_extend_sessions_past_half_their_lifetime():
+    backend = MemorySessionBackend(max_entries=10, ttl=60)
+    client = _client(backend)
+    session_id = client.get("/set").cookies["sid"]
+    assert "set-cookie" not in client.get("/get").headers
+
+    # 有効期間の残りが半分を切った状態にする
+    backend.ttl = 20
+    backend.save(session_id, {"user": {"id": 1}})
+    backend.ttl = 60
+    response = client.get("/get")
+
+    assert response.cookies["sid"] == session_id
+    assert backend.load(session_id)[1] > 20
@@ -0,0 +1,13 @@
+from app.core.templates import cached_fragment, precompile_templates
+
+
+def test_all_templates_precompile():
+    assert precompile_templates() >= 6
+
+
+def test_scope_fragment_is_cached_per_scope_set():
+    fragment = cached_fragment("_scope_list.html", "email profile")
+
+    assert cached_fragment("_scope_list.html", "profile email") is fragment
+    assert fragment.index("プロフィール情報") < fragment.index("メールアドレス")
+    assert "&lt;" in cached_fragment("_scope_list.html", "<script>")
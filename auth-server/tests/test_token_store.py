@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from app.services.revocation import BloomFilter, RevocationList
+from app.services.token_store import MemoryTokenStore, SQLiteTokenStore
+
+
+def test_sweep_removes_expired_entries():
+    store = MemoryTokenStore("test", max_entries=10)
+    now = datetime.now()
+    store.set("expired", {"v": 1}, now - timedelta(seconds=1))
+    store.set("live", {"v": 2}, now + timedelta(minutes=1))
+
+    assert store.sweep(now) == 1
+    assert "expired" not in store
+    assert store.get("live") == {"v": 2}
+    assert store.stats() == {"live": 1, "expired_swept": 1, "evicted": 0}
+
+
+def test_evicts_soonest_expiring_entry_when_full():
+    store = MemoryTokenStore("test", max_entries=2)
+    now = datetime.now()
+    store.set("a", {}, now + timedelta(minutes=5))
+    store.set("b", {}, now + timedelta(minutes=1))
+    store.set("c", {}, now + timedelta(minutes=10))
+
+    assert "b" not in store
+    assert "a" in store and "c" in store
+    assert store.stats()["evicted"] == 1
+
+
+def test_pop_is_single_use():
+    store = MemoryTokenStore("test", max_entries=10)
+    store.set("code", {"v": 1}, datetime.now() + timedelta(minutes=1))
+
+    assert store.pop("code") == {"v": 1}
+    assert store.pop("code") is None
+    assert store.sweep(datetime.now() + timedelta(minutes=2)) == 0
+
+
+def test_pop_group_removes_only_group_members():
+    store = MemoryTokenStore("test", max_entries=10)
+    expires_at = datetime.now() + timedelta(minutes=1)
+    store.set("a", {"v": 1}, expires_at, group="family-1")
+    store.set("b", {"v": 2}, expires_at, group="family-1")
+    store.set("c", {"v": 3}, expires_at, group="family-2")
+    store.delete("b")
+
+    assert store.pop_group("family-1") == [{"v": 1}]
+    assert "a" not in store
+    assert "c" in store
+    assert store.pop_group("family-1") == []
+
+
+def test_sqlite_store_is_shared_and_single_use(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    worker1 = SQLiteTokenStore("codes", max_entries=10, path=path)
+    worker2 = SQLiteTokenStore("codes", max_entries=10, path=path)
+    expires_at = datetime.now() + timedelta(minutes=1)
+    worker1.set("code", {"user_id": 1, "expires_at": expires_at}, expires_at, "f1")
+
+    assert worker2.pop("code") == {"user_id": 1, "expires_at": expires_at}
+    assert worker1.pop("code") is None
+
+    worker1.set("a", {}, expires_at, group="f1")
+    worker1.set("expired", {}, datetime.now() - timedelta(seconds=1))
+    assert worker2.pop_group("f1") == [{}]
+    assert worker2.sweep() == 1
+    assert len(worker1) == 0
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_revocation_list_forgets_expired_ids():
+    revocations = RevocationList(MemoryTokenStore("revoked", max_entries=10))
+    now = datetime.now()
+    revocations.revoke("expired", now - timedelta(seconds=1))
+    revocations.revoke("live", now + timedelta(minutes=1))
+
+    assert revocations.is_revoked("expired")
+    revocations.sweep(now)
+    assert not revocations.is_revoked("expired")
+    assert revocations.is_revoked("live")
+    assert not revocations.is_revoked("never-revoked")
+
+
+def test_set_if_absent_ignores_live_entries(tmp_path):
+    now = datetime.now()
+    for store in (
+        MemoryTokenStore("ids", max_entries=10),
+        SQLiteTokenStore("ids", max_entries=10, path=str(tmp_path / "ids.db")),
+    ):
+        assert store.set_if_absent("a", {}, now + timedelta(minutes=1))
+        assert not store.set_if_absent("a", {}, now + timedelta(minutes=1))
+        store.set("expired", {}, now - timedelta(seconds=1))
+        assert store.set_if_absent("expired", {}, now + timedelta(minutes=1))
+
+
+def test_uncapped_store_never_evicts():
+    store = MemoryTokenStore("test", max_entries=None)
+    expires_at = datetime.now() + timedelta(minutes=1)
+    for i in range(100):
+        store.set_if_absent(f"code{i}", {}, expires_at)
+
+    assert len(store) == 100
+    assert store.stats()["evicted"] == 0
+    assert not store.set_if_absent("code0", {}, expires_at)
+
+
+def test_sqlite_store_enforces_limit_on_insert(tmp_path):
+    store = SQLiteTokenStore("test", max_entries=2, path=str(tmp_path / "tokens.db"))
+    now = datetime.now()
+    store.set("a", {}, now + timedelta(minutes=5))
+    store.set("b", {}, now + timedelta(minutes=1))
+    store.set("a", {"v": 2}, now + timedelta(minutes=5))
+    assert len(store) == 2
+    assert store.set_if_absent("c", {}, now + timedelta(minutes=10))
+
+    assert len(store) == 2
+    assert "b" not in store
+    assert store.stats()["evicted"] == 1
+    # 件数の集計は別のワーカーから開いても一致する
+    assert len(SQLiteTokenStore("test", 2, str(tmp_path / "tokens.db"))) == 2
@@ -0,0 +1,80 @@
+import asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.database import Base
+from app.models.user import User
+from app.services.user_cache import (
+    MISS,
+    UserLookupCache,
+    get_user_by_id,
+    get_user_by_username,
+    user_cache,
+)
+
+
+def test_negative_entries_expire_sooner():
+    cache = UserLookupCache(max_entries=10, ttl=60, negative_ttl=0)
+    cache.put_missing(("username", "ghost"))
+
+    assert cache.get(("username", "ghost")) is MISS
+    cache.negative_ttl = 60
+    cache.put_missing(("username", "ghost"))
+    assert cache.get(("username", "ghost")) is None
+
+
+def test_lookups_hit_the_database_once(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        queries = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: queries.append(statement),
+        )
+        async with async_sessionmaker(engine)() as db:
+            db.add(User(id=1, username="alice", password="x"))
+            await db.commit()
+            queries.clear()
+
+            user = await get_user_by_username(db, "alice")
+            assert (await get_user_by_id(db, 1)) == user
+            assert await get_user_by_username(db, "ghost") is None
+            assert await get_user_by_username(db, "ghost") is None
+            assert len(queries) == 2
+
+            # 書き込み後の明示的な無効化で両方のキーが消える
+            user_cache.invalidate(username="alice")
+            assert user_cache.get(("id", 1)) is MISS
+        await engine.dispose()
+
+    user_cache.clear()
+    try:
+        asyncio.run(run())
+    finally:
+        user_cache.clear()
+
+
+def test_negative_entry_can_be_bypassed(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(engine)() as db:
+            assert await get_user_by_username(db, "alice") is None
+            # 別のワーカーで登録され、このワーカーには否定エントリが残っている
+            db.add(User(id=1, username="alice", password="x"))
+            await db.commit()
+
+            assert await get_user_by_username(db, "alice") is None
+            user = await get_user_by_username(db, "alice", trust_missing=False)
+            assert user.id == 1
+            assert await get_user_by_username(db, "alice") == user
+        await engine.dispose()
+
+    user_cache.clear()
+    try:
+        asyncio.run(run())
+    finally:
+        user_cache.clear()
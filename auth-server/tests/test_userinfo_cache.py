@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import json
+from app.models.user import User
+from app.services.userinfo_cache import UserinfoCache
+
+
+def _user(updated_at: datetime) -> User:
+    return User(
+        id=1,
+        sub="sub-1",
+        username="test1",
+        email="test1@example.com",
+        email_verified=True,
+        updated_at=updated_at,
+    )
+
+
+def test_entry_is_reused_until_updated_at_changes():
+    cache = UserinfoCache(max_entries=10)
+    updated_at = datetime(2025, 1, 1)
+    scopes = frozenset({"profile"})
+    entry = cache.build(_user(updated_at), scopes)
+
+    assert cache.get(1, scopes, updated_at) is entry
+    assert cache.get(1, scopes, updated_at + timedelta(seconds=1)) is None
+    assert "email" not in json.loads(entry.body)
+
+
+def test_etag_depends_on_scope_and_lru_eviction():
+    cache = UserinfoCache(max_entries=1)
+    updated_at = datetime(2025, 1, 1)
+    profile = cache.build(_user(updated_at), frozenset({"profile"}))
+    email = cache.build(_user(updated_at), frozenset({"profile", "email"}))
+
+    assert profile.etag != email.etag
+    assert json.loads(email.body)["email"] == "test1@example.com"
+    assert cache.get(1, frozenset({"profile"}), updated_at) is None
+    assert len(cache) == 1
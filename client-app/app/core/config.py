@@ -10,7 +10,7 @@ class Settings(BaseSettings):
     CLIENT_SECRET: str = "client-secret"
     REDIRECT_URI: str = "http://localhost:8001/auth/callback"
     AUTH_SERVER_URL: str = "http://localhost:8000"
-    SCOPE: str = "profile email"
+    SCOPE: str = "openid profile email"
 
 
 settings = Settings()
@@ -0,0 +1,45 @@
+from typing import Optional
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.jose.errors import JoseError
+from authlib.jose.util import extract_header
+from authlib.common.encoding import to_bytes
+import httpx
+from app.core.config import settings
+
+# 認可サーバーはIDトークンを常に RS256 で署名する。他のアルゴリズムは受け付けない
+jwt = JsonWebToken(["RS256"])
+
+# 認可サーバーの公開鍵 (JWKS)。未知の kid の場合のみ取得し直す
+_jwks: Optional[dict] = None
+
+
+async def _load_jwks(client: httpx.AsyncClient, kid: Optional[str]) -> dict:
+    global _jwks
+    if _jwks is None or kid not in {key.get("kid") for key in _jwks["keys"]}:
+        response = await client.get(f"{settings.AUTH_SERVER_URL}/.well-known/jwks.json")
+        response.raise_for_status()
+        _jwks = response.json()
+    return _jwks
+
+
+async def verify_id_token(
+    client: httpx.AsyncClient, id_token: str, nonce: Optional[str]
+) -> dict:
+    """IDトークンの署名・発行者・対象者・有効期限・nonce を検証し、クレームを返す"""
+    try:
+        header = extract_header(to_bytes(id_token).split(b".")[0], ValueError)
+        jwks = await _load_jwks(client, header.get("kid"))
+        claims = jwt.decode(
+            id_token,
+            JsonWebKey.import_key_set(jwks),
+            claims_options={
+                "iss": {"essential": True, "value": settings.AUTH_SERVER_URL},
+                "aud": {"essential": True, "value": settings.CLIENT_ID},
+                "exp": {"essential": True},
+                "nonce": {"essential": nonce is not None, "value": nonce},
+            },
+        )
+        claims.validate()
+    except JoseError as e:
+        raise ValueError(f"IDトークンの検証に失敗しました: {e}")
+    return dict(claims)
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.user import User, OAuthAccount
 from app.core.config import settings
+from app.core.id_token import verify_id_token
 import httpx
 import secrets
 from app.core.security import get_password_hash
@@ -24,6 +25,9 @@ async def login_page(request: Request):
 async def oauth_login(request: Request):
     state = secrets.token_urlsafe(32)
     request.session["oauth_state"] = state
+    # IDトークンのリプレイ対策
+    nonce = secrets.token_urlsafe(32)
+    request.session["oauth_nonce"] = nonce
 
     return RedirectResponse(
         f"{settings.AUTH_SERVER_URL}/oauth/authorize?"
@@ -31,7 +35,8 @@ async def oauth_login(request: Request):
         f"client_id={settings.CLIENT_ID}&"
         f"redirect_uri={settings.REDIRECT_URI}&"
         f"scope={settings.SCOPE}&"
-        f"state={state}"
+        f"state={state}&"
+        f"nonce={nonce}"
     )
 
 
@@ -44,6 +49,7 @@ async def oauth_callback(
     db: Session = Depends(get_db),
 ):
     stored_state = request.session.pop("oauth_state", None)
+    nonce = request.session.pop("oauth_nonce", None)
     if not stored_state or stored_state != state:
         return templates.TemplateResponse(
             request=request,
@@ -105,17 +111,21 @@ async def oauth_callback(
             if token_data["token_type"].lower() != "bearer":
                 raise ValueError("Bearerトークンタイプのみサポートしています")
 
-            user_response = await client.get(
-                f"{settings.AUTH_SERVER_URL}/oauth/userinfo",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-
-            if user_response.status_code != 200:
-                raise HTTPException(
-                    status_code=400, detail="ユーザー情報取得に失敗しました"
+            if token_data.get("id_token"):
+                # IDトークンのクレームを使い、userinfoへの問い合わせを省略する
+                user_data = await verify_id_token(client, token_data["id_token"], nonce)
+            else:
+                user_response = await client.get(
+                    f"{settings.AUTH_SERVER_URL}/oauth/userinfo",
+                    headers={"Authorization": f"Bearer {access_token}"},
                 )
 
-            user_data = user_response.json()
+                if user_response.status_code != 200:
+                    raise HTTPException(
+                        status_code=400, detail="ユーザー情報取得に失敗しました"
+                    )
+
+                user_data = user_response.json()
 
             # OAuthアカウントを検索
             oauth_account = (
@@ -131,8 +141,10 @@ async def oauth_callback(
                 # 既存のOAuthアカウントが見つかった場合
                 user = oauth_account.user
                 # プロバイダーのユーザー名が変更されている可能性があるため更新
-                oauth_account.provider_username = user_data["preferred_username"]
-                db.commit()
+                # (profile スコープがない場合は preferred_username が含まれない)
+                if user_data.get("preferred_username"):
+                    oauth_account.provider_username = user_data["preferred_username"]
+                    db.commit()
             else:
                 # 新規ユーザー登録が必要
                 return templates.TemplateResponse(
@@ -142,7 +154,7 @@ async def oauth_callback(
                         "request": request,
                         "oauth_provider": "auth_server",
                         "oauth_sub": user_data["sub"],
-                        "oauth_username": user_data["preferred_username"],
+                        "oauth_username": user_data.get("preferred_username", ""),
                     },
                 )
 
@@ -0,0 +1,82 @@
+import asyncio
+import time
+import httpx
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+from app.core import id_token
+from app.core.config import settings
+from app.core.id_token import verify_id_token
+
+jwt = JsonWebToken(["HS256", "RS256"])
+key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+kid = key.thumbprint()
+jwks = {"keys": [{**key.as_dict(is_private=False), "kid": kid}]}
+
+
+def _claims(**overrides) -> dict:
+    now = int(time.time())
+    return {
+        "iss": settings.AUTH_SERVER_URL,
+        "aud": settings.CLIENT_ID,
+        "sub": "sub-1",
+        "iat": now,
+        "exp": now + 300,
+        "nonce": "n-0S6_WzA2Mj",
+        **overrides,
+    }
+
+
+def _rs256_token(**overrides) -> str:
+    header = {"alg": "RS256", "typ": "JWT", "kid": kid}
+    return jwt.encode(header, _claims(**overrides), key).decode()
+
+
+def _verify(token: str, nonce="n-0S6_WzA2Mj", requests=None) -> dict:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request.url.path)
+        return httpx.Response(200, json=jwks)
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await verify_id_token(client, token, nonce)
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def _reset_jwks(monkeypatch):
+    monkeypatch.setattr(id_token, "_jwks", None)
+
+
+def test_rs256_id_token_is_verified_with_jwks():
+    requests = []
+    token = _rs256_token()
+
+    assert _verify(token, requests=requests)["sub"] == "sub-1"
+    # 既知の kid では JWKS を取得し直さない
+    assert _verify(token, requests=requests)["sub"] == "sub-1"
+    assert requests == ["/.well-known/jwks.json"]
+
+
+def test_hs256_id_token_signed_with_client_secret_is_rejected():
+    header = {"alg": "HS256", "typ": "JWT"}
+    token = jwt.encode(header, _claims(), settings.CLIENT_SECRET).decode()
+
+    with pytest.raises(ValueError):
+        _verify(token)
+
+
+@pytest.mark.parametrize(
+    "overrides, nonce",
+    [
+        ({}, "other-nonce"),
+        ({"aud": "other-client"}, "n-0S6_WzA2Mj"),
+        ({"iss": "http://evil.example.com"}, "n-0S6_WzA2Mj"),
+        ({"exp": int(time.time()) - 60}, "n-0S6_WzA2Mj"),
+    ],
+)
+def test_invalid_id_token_is_rejected(overrides, nonce):
+    with pytest.raises(ValueError):
+        _verify(_rs256_token(**overrides), nonce=nonce)